@@ -1,19 +1,38 @@
 from django.contrib import admin
 
 from .models import Group, Post
+from .paginators import EstimatedCountPaginator
+from .search import search
 
 
-class PostAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список без полного COUNT(*) на каждый запрос: число строк
+    оценивается или берётся из кэша, «всего N» не считается.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(LargeTableAdmin):
     """
     Админка для модели Post.
     """
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%q%'."""
+        if not search_term.strip():
+            return queryset, False
+        return search(queryset, search_term), False
+
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(LargeTableAdmin):
     """
     Админка для модели Group.
     """
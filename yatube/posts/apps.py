@@ -6,3 +6,6 @@ class PostsConfig(AppConfig):
     Конфигурация приложения posts.
     """
     name = 'posts'
+
+    def ready(self):
+        from . import db, signals  # noqa: F401
@@ -0,0 +1,192 @@
+"""
+Асинхронные версии страниц чтения для запуска под ASGI
+(settings.ASYNC_VIEWS). Пока view ждёт базу или медленного клиента,
+воркер обслуживает другие запросы.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import QuerySet
+from django.http import Http404
+from django.shortcuts import render
+
+from .cache import cache_anonymous_page, conditional_page, feed_key
+from .comments import (CommentWindow, comment_position, render_comments_page,
+                       render_with_comments)
+from .forms import CommentForm
+from .models import Follow, Group, Post, User, UserCounter
+from .pages import (comments_pages, follow_pages, group_pages, index_pages,
+                    post_pages, profile_pages)
+from .paginators import paginate
+from .routers import use_replica
+from .timeline import TimelinePaginator
+
+# Асинхронный интерфейс ORM (aget, aexists, ...) есть с Django 4.1.
+# И он, и sync_to_async выполняют запросы в одном потоке
+# (thread_sensitive), поэтому независимые запросы view ждут друг друга;
+# запускать их одновременно через asyncio.gather имеет смысл только
+# с настоящим асинхронным драйвером базы
+ASYNC_ORM = hasattr(QuerySet, 'aget')
+
+# Пагинаторы и шаблоны обращаются к базе и кэшу синхронно
+paginate_async = sync_to_async(paginate)
+render_async = sync_to_async(render)
+
+
+def run_query(queryset, method, *args, **kwargs):
+    """
+    Корутина метода queryset: a<method> асинхронного ORM, а в старом
+    Django — синхронный метод в потоке через sync_to_async.
+    """
+    if ASYNC_ORM:
+        return getattr(queryset, f'a{method}')(*args, **kwargs)
+    return sync_to_async(getattr(queryset, method))(*args, **kwargs)
+
+
+async def get_object_or_404(queryset, **kwargs):
+    try:
+        return await run_query(queryset, 'get', **kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(
+            f'{queryset.model._meta.object_name} не найден по запросу.'
+        )
+
+
+async def is_authenticated(request):
+    """
+    request.user.is_authenticated. Ленивый пользователь при первом
+    обращении читает сессию из базы, поэтому проверка идёт в потоке;
+    дальше request.user уже загружен.
+    """
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+def login_required(view):
+    """login_required для асинхронных view."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if await is_authenticated(request):
+            return await view(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+    return wrapper
+
+
+async def is_following(request, author):
+    if not await is_authenticated(request):
+        return False
+    return await run_query(
+        Follow.objects.filter(user=request.user, author=author), 'exists'
+    )
+
+
+async def author_page(request, author):
+    """Счётчики автора и страница его постов с известным числом постов."""
+    counters = await sync_to_async(UserCounter.for_user)(author)
+    page = await paginate_async(
+        request, author.posts.for_feed(), count=counters.posts
+    )
+    return counters, page
+
+
+async def author_counters(username):
+    author = await get_object_or_404(User.objects, username=username)
+    return author, await sync_to_async(UserCounter.for_user)(author)
+
+
+@use_replica
+@conditional_page(index_pages)
+@cache_anonymous_page
+async def index(request):
+    """
+    Главная страница.
+    """
+    cache_key = await sync_to_async(feed_key)('index')
+    page = await paginate_async(
+        request, Post.objects.for_feed(), cache_key=cache_key
+    )
+    return await render_async(request, 'posts/index.html', {'page': page})
+
+
+@use_replica
+@conditional_page(group_pages)
+@cache_anonymous_page
+async def group_posts(request, slug):
+    """
+    Страница группы.
+    """
+    group = await get_object_or_404(Group.objects, slug=slug)
+    page = await paginate_async(request, group.groups.for_feed())
+    return await render_async(request, 'posts/group.html', {'group': group,
+                                                            'page': page})
+
+
+@use_replica
+@conditional_page(profile_pages)
+@cache_anonymous_page
+async def profile(request, username):
+    """
+    Страница профиля автора со всеми постами.
+    """
+    author = await get_object_or_404(User.objects, username=username)
+    counters, page = await author_page(request, author)
+    following = await is_following(request, author)
+    return await render_async(request, 'posts/profile.html', {
+        'author': author,
+        'count': counters.posts,
+        'counters': counters,
+        'page': page,
+        'following': following,
+    })
+
+
+@use_replica
+@conditional_page(post_pages)
+@cache_anonymous_page
+async def post_view(request, username, post_id):
+    """
+    Страница отдельного поста.
+    """
+    author, counters = await author_counters(username)
+    post = await get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    # Django 3.2 под ASGI перебирает потоковый ответ прямо в цикле
+    # событий, где ORM недоступен, поэтому окно комментариев
+    # рендерится целиком; его размер ограничен POST_COMMENTS
+    return await sync_to_async(render_with_comments)(
+        request, 'posts/post.html', {
+            'author': author,
+            'count': counters.posts,
+            'counters': counters,
+            'post': post,
+            'form': CommentForm(),
+            'comments': CommentWindow(post, comment_position(request)),
+        }, stream=False
+    )
+
+
+@use_replica
+@conditional_page(comments_pages)
+@cache_anonymous_page
+async def post_comments(request, username, post_id):
+    """
+    Более старые комментарии поста: HTML-фрагмент или JSON.
+    """
+    return await sync_to_async(render_comments_page)(
+        request, username, post_id
+    )
+
+
+@use_replica
+@login_required
+@conditional_page(follow_pages)
+async def follow_index(request):
+    """
+    Страница с избранными авторами.
+    """
+    post_list = Post.objects.for_feed().filter(
+        author__following__user=request.user
+    )
+    page = await paginate_async(
+        request, post_list, TimelinePaginator, user=request.user
+    )
+    return await render_async(request, 'posts/follow.html', {'page': page})
@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+QueryBudget = namedtuple('QueryBudget', ('queries', 'time_ms'))
+
+# Бюджет запросов к БД на один ответ view из posts/urls.py: число
+# запросов и суммарное время SQL в миллисекундах. Считается для
+# страницы из POST_PAGE постов с холодным кэшем.
+QUERY_BUDGETS = {
+    'index': QueryBudget(4, 100),
+    'follow_index': QueryBudget(6, 100),
+    'group_posts': QueryBudget(4, 100),
+    'search': QueryBudget(3, 100),
+    'profile': QueryBudget(6, 100),
+    'post': QueryBudget(6, 100),
+    'post_comments': QueryBudget(4, 50),
+    'new_post': QueryBudget(3, 50),
+    'post_edit': QueryBudget(5, 50),
+    'add_comment': QueryBudget(6, 50),
+    'profile_follow': QueryBudget(12, 50),
+    'profile_unfollow': QueryBudget(10, 50),
+}
+
+
+class QueryBudgetExceeded(Exception):
+    """View вышел за объявленный бюджет запросов."""
+
+
+def check_budget(url_name, queries, time_ms):
+    """
+    Сообщение о превышении бюджета для url_name или None.
+    Для view без бюджета проверка не делается.
+    """
+    budget = QUERY_BUDGETS.get(url_name)
+    if budget is None:
+        return None
+    if queries > budget.queries or time_ms > budget.time_ms:
+        return (
+            f'{url_name}: {queries} запросов за {time_ms:.1f} мс, '
+            f'бюджет {budget.queries} запросов и {budget.time_ms} мс'
+        )
+    return None
@@ -0,0 +1,353 @@
+import asyncio
+import hashlib
+import math
+import random
+import time
+import uuid
+from calendar import timegm
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .routers import read_primary
+
+
+def version_key(kind, pk):
+    return f'posts:version:{kind}:{pk}'
+
+
+def bump_version(kind, pk):
+    """
+    Сдвигает версию объекта: все фрагменты, собранные со старой
+    версией, перестают находиться в кэше. Версия — время изменения
+    в наносекундах, поэтому она же годится для Last-Modified.
+    """
+    cache.set(version_key(kind, pk), time.time_ns(), None)
+
+
+def bump_versions(items):
+    """Сдвигает версии пар (kind, pk) одним обращением к кэшу."""
+    version = time.time_ns()
+    cache.set_many({version_key(*item): version for item in items}, None)
+
+
+def get_versions(items):
+    """
+    Версии для пар (kind, pk). Потерянная (вытесненная) версия
+    заменяется новой уникальной, чтобы не совпасть со старыми ключами.
+    """
+    keys = {item: version_key(*item) for item in items}
+    found = cache.get_many(keys.values())
+    missing = {
+        key: time.time_ns() for key in keys.values() if key not in found
+    }
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {item: found[key] for item, key in keys.items()}
+
+
+def card_key(post, versions, is_author):
+    """Ключ фрагмента карточки поста."""
+    group_version = versions.get(('group', post.group_id), 0)
+    return (
+        f'posts:card:{post.pk}:{versions[("post", post.pk)]}:'
+        f'{post.group_id}:{group_version}:{int(is_author)}'
+    )
+
+
+def render_cards(posts, render, user):
+    """
+    HTML карточек постов: готовые берутся из кэша одним запросом,
+    недостающие рендерятся через render(post) и сохраняются.
+    """
+    posts = list(posts)
+    items = {('post', post.pk) for post in posts}
+    items |= {('group', post.group_id) for post in posts if post.group_id}
+    versions = get_versions(items)
+    keys = [
+        card_key(post, versions, post.author_id == user.pk)
+        for post in posts
+    ]
+    fragments = cache.get_many(keys)
+    rendered = {}
+    for post, key in zip(posts, keys):
+        if key not in fragments:
+            rendered[key] = fragments[key] = render(post)
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return ''.join(fragments[key] for key in keys)
+
+
+def feed_key(name):
+    """Ключ первой страницы ленты с текущей версией ленты."""
+    version = get_versions([('feed', name)])[('feed', name)]
+    return f'posts:feed:{name}:{version}'
+
+
+def _expired(delta, expires, beta):
+    """
+    Вероятностный ранний пересчёт (XFetch): чем ближе истечение и чем
+    дольше пересчёт (delta), тем выше шанс пересчитать заранее.
+    """
+    return time.time() - delta * beta * math.log(random.random()) >= expires
+
+
+def _acquire(key):
+    token = uuid.uuid4().hex
+    if cache.add(f'{key}:lock', token, settings.CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release(key, token):
+    if cache.get(f'{key}:lock') == token:
+        cache.delete(f'{key}:lock')
+
+
+def _wait(key):
+    """Ждёт, пока значение соберёт другой процесс."""
+    deadline = time.time() + settings.CACHE_LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(settings.CACHE_LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(f'{key}:lock') is None:
+            break
+    return None
+
+
+def get_or_build(key, build, timeout, beta=None):
+    """
+    Значение из кэша или build().
+
+    Пересчёт выполняет один процесс (single-flight через cache.add):
+    остальные отдают старое значение, а при пустом кэше ждут его.
+    Незадолго до истечения ключ пересчитывается заранее с
+    вероятностью, растущей к концу срока жизни.
+    """
+    beta = settings.CACHE_EARLY_BETA if beta is None else beta
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires = entry
+        if not _expired(delta, expires, beta):
+            return value
+    token = _acquire(key)
+    if token is None:
+        if entry is not None:
+            return entry[0]
+        entry = _wait(key)
+        if entry is not None:
+            return entry[0]
+    try:
+        started = time.time()
+        value = build()
+        delta = time.time() - started
+        cache.set(key, (value, delta, time.time() + timeout), timeout)
+    finally:
+        if token is not None:
+            _release(key, token)
+    return value
+
+
+SITE_PAGES = ('site', 'pages')
+
+
+def page_versions(request):
+    """
+    Версии, от которых зависит страница запроса: общая версия сайта
+    и версии, перечисленные view в conditional_page.
+    """
+    versions = getattr(request, 'page_versions', None)
+    if versions is None:
+        versions = request.page_versions = [
+            get_versions([SITE_PAGES])[SITE_PAGES]
+        ]
+    return versions
+
+
+def page_key(request):
+    """
+    Ключ страницы для анонимов: путь, все параметры запроса
+    (page, cursor и прочие) и версии содержимого страницы.
+    """
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    versions = ':'.join(map(str, page_versions(request)))
+    return f'posts:page:{digest}:{versions}'
+
+
+def page_etag(request, *args, **kwargs):
+    """
+    ETag страницы без рендера: ключ страницы плюс пользователь, его
+    сессия и CSRF-токен. Страница авторизованного пользователя содержит
+    CSRF-токен, поэтому после выхода и повторного входа сохранённая
+    копия с устаревшим токеном не подтверждается ответом 304.
+    """
+    user = session = csrf = ''
+    if request.user.is_authenticated:
+        user = request.user.pk
+        session = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+        # get_token выдаёт токен заранее: страница отрендерится с ним же,
+        # и CSRF-cookie первого ответа не поменяет ETag следующего запроса
+        get_token(request)
+        csrf = request.META['CSRF_COOKIE']
+    return hashlib.md5(
+        f'{page_key(request)}:{user}:{session}:{csrf}'.encode()
+    ).hexdigest()
+
+
+def page_last_modified(request, *args, **kwargs):
+    """Время последнего изменения содержимого страницы."""
+    return datetime.fromtimestamp(
+        max(page_versions(request)) / 1e9, tz=timezone.utc
+    )
+
+
+def changed_recently(request):
+    """
+    Страница менялась последние REPLICA_LAG секунд: реплики могли ещё
+    не получить изменения, а собранное с них попало бы в кэш и в
+    ETag уже под новой версией.
+    """
+    age = time.time_ns() - max(page_versions(request))
+    return age < settings.REPLICA_LAG * 10 ** 9
+
+
+def page_validators(request, versions, *args, **kwargs):
+    """
+    ETag и Last-Modified (в секундах) страницы для запроса.
+    versions(request, *args, **kwargs) перечисляет пары (kind, pk),
+    от которых зависит страница.
+    """
+    items = [SITE_PAGES, *versions(request, *args, **kwargs)]
+    found = get_versions(items)
+    request.page_versions = [found[item] for item in items]
+    last_modified = timegm(page_last_modified(request).utctimetuple())
+    return quote_etag(page_etag(request)), last_modified
+
+
+def set_validators(request, response, etag, last_modified):
+    if request.method in ('GET', 'HEAD'):
+        if not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+def conditional_page(versions):
+    """
+    Отвечает 304 Not Modified, не вызывая view, если копия клиента
+    актуальна (If-None-Match / If-Modified-Since).
+
+    Валидаторы собираются из версий, которые возвращает
+    versions(request, *args, **kwargs): страница поста не устаревает
+    от комментария к другому посту. Те же версии входят в ключ
+    cache_anonymous_page. Если версии сдвигались последние REPLICA_LAG
+    секунд, страница собирается с основной базы, а не с реплики.
+    Годится и для асинхронных view: валидаторы читают кэш и сессию,
+    поэтому считаются через sync_to_async.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag, last_modified = await sync_to_async(page_validators)(
+                    request, versions, *args, **kwargs
+                )
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+                if response is None:
+                    if changed_recently(request):
+                        read_primary()
+                    response = await view(request, *args, **kwargs)
+                return set_validators(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag, last_modified = page_validators(
+                request, versions, *args, **kwargs
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                if changed_recently(request):
+                    read_primary()
+                response = view(request, *args, **kwargs)
+            return set_validators(request, response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def cached_page(request):
+    """
+    Ключ и запись кэша страницы. Ключ None — запрос не кэшируется:
+    это не GET или пользователь авторизован.
+    """
+    if (request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated):
+        return None, None
+    key = page_key(request)
+    return key, cache.get(key)
+
+
+def cached_response(entry):
+    response = HttpResponse(entry[0], content_type=entry[1])
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def store_page(key, response):
+    """Сохраняет удачный ответ без cookie в кэш страниц."""
+    if (response.status_code != 200 or response.cookies
+            or response.streaming):
+        return response
+    entry = (response.content, response['Content-Type'])
+    cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_anonymous_page(view):
+    """
+    Кэширует готовый HTML страницы для анонимных GET-запросов.
+
+    Запросы авторизованных пользователей идут мимо кэша: у них свои
+    кнопки «Редактировать» и CSRF-токены. Ключ содержит версии,
+    собранные conditional_page для этой страницы, поэтому запись
+    устаревает только при изменении показанного на ней. Валидаторы и
+    ответ 304 добавляет conditional_page.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            key, entry = await sync_to_async(cached_page)(request)
+            if key is None:
+                return await view(request, *args, **kwargs)
+            if entry is not None:
+                return cached_response(entry)
+            response = await view(request, *args, **kwargs)
+            return await sync_to_async(store_page)(key, response)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key, entry = cached_page(request)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if entry is not None:
+            return cached_response(entry)
+        return store_page(key, view(request, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+from .paginators import OLDER, decode_cursor, encode_cursor, keyset
+
+# Место комментариев в странице, которая отдаётся потоком
+STREAM_MARKER = mark_safe('<!-- comments -->')
+
+
+def comment_position(request):
+    """
+    Позиция (created, id) из ?comments=: показывать комментарии
+    старше неё. Для первой страницы и битого курсора — None.
+    """
+    cursor = decode_cursor(request.GET.get('comments') or '')
+    if cursor is None or cursor[0] != OLDER:
+        return None
+    return cursor[1]
+
+
+class CommentWindow:
+    """
+    Комментарии поста post (или поста с таким id) от новых к старым:
+    не больше limit штук после позиции position.
+
+    Читаются кусками по chunk_size, каждый кусок — один запрос по
+    индексу comment_post_created_idx вместе с авторами. С username
+    в тот же запрос входит проверка автора поста. После чтения
+    next_cursor — курсор следующих, более старых комментариев или
+    None, если их нет.
+    """
+
+    def __init__(self, post, position=None, limit=None, chunk_size=None,
+                 username=None):
+        self.post = post
+        self.username = username
+        self.position = position
+        self.limit = limit or settings.POST_COMMENTS
+        self.chunk_size = chunk_size or settings.COMMENT_STREAM_CHUNK
+        self.next_cursor = None
+
+    @property
+    def streams(self):
+        """Отдавать ли страницу потоком: комментариев больше порога."""
+        return self.post.comments_count > settings.COMMENT_STREAM_THRESHOLD
+
+    def chunks(self):
+        self.next_cursor = None
+        position, remaining = self.position, self.limit
+        while remaining > 0:
+            size = min(self.chunk_size, remaining)
+            # Лишняя строка показывает, есть ли комментарии дальше
+            items = keyset(
+                self.queryset(), position, False, size + 1,
+                date_field='created'
+            )
+            more = len(items) > size
+            items = items[:size]
+            if not items:
+                return
+            yield items
+            remaining -= len(items)
+            position = (items[-1].created, items[-1].pk)
+            if not more:
+                return
+        self.next_cursor = encode_cursor(OLDER, position)
+
+    def queryset(self):
+        comments = Comment.objects.for_post(self.post)
+        if self.username is not None:
+            comments = comments.filter(post__author__username=self.username)
+        return comments
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+
+def stream_page(html, window, more_url):
+    """
+    Страница кусками: всё до комментариев, комментарии по
+    window.chunk_size, ссылка на более старые и остаток страницы.
+    """
+    head, tail = html.split(STREAM_MARKER, 1)
+    yield head
+    for chunk in window.chunks():
+        yield render_to_string(
+            'posts/comment_list.html', {'comments': chunk}
+        )
+    yield render_to_string('posts/comments_more.html', {
+        'next_cursor': window.next_cursor, 'more_url': more_url
+    })
+    yield tail
+
+
+def render_with_comments(request, template_name, context, stream=True):
+    """
+    Страница с окном комментариев context['comments']. Если у поста
+    комментариев больше COMMENT_STREAM_THRESHOLD, ответ потоковый:
+    первый байт уходит до чтения комментариев, а память на запрос
+    не растёт с их числом.
+    """
+    window = context['comments']
+    if not (stream and window.streams):
+        return render(request, template_name, context)
+    html = render_to_string(
+        template_name, dict(context, stream=STREAM_MARKER), request
+    )
+    post = context['post']
+    more_url = reverse('post_comments', args=[post.author.username, post.pk])
+    return StreamingHttpResponse(stream_page(html, window, more_url))
+
+
+def render_comments_page(request, username, post_id):
+    """
+    Страница более старых комментариев поста после ?comments=:
+    HTML-фрагмент для подгрузки на странице поста или JSON при
+    ?format=json. Комментарии с авторами читаются одним запросом
+    вместе с проверкой автора поста; существование поста отдельно
+    проверяется, только если страница пуста.
+    """
+    window = CommentWindow(
+        post_id, comment_position(request),
+        limit=settings.COMMENTS_PAGE, chunk_size=settings.COMMENTS_PAGE,
+        username=username
+    )
+    comments = list(window)
+    if not comments and not Post.objects.filter(
+        pk=post_id, author__username=username
+    ).exists():
+        raise Http404('Пост не найден.')
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next': window.next_cursor,
+        })
+    return render(request, 'posts/comments_page.html', {
+        'comments': comments,
+        'next_cursor': window.next_cursor,
+        'more_url': reverse('post_comments', args=[username, post_id]),
+    })
@@ -0,0 +1,40 @@
+import django
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(cursor, pragmas):
+    """Выполняет PRAGMA name = value для каждой пары из pragmas."""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """
+    Настраивает каждое новое соединение SQLite по SQLITE_PRAGMAS:
+    WAL позволяет читать во время записи, busy_timeout ждёт
+    блокировку вместо ошибки «database is locked».
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """
+    CONN_HEALTH_CHECKS для Django до 4.1: постоянное соединение,
+    которое оборвала база, закрывается до начала запроса, и view
+    получает новое вместо ошибки.
+    """
+    if django.VERSION >= (4, 1):
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
@@ -1,6 +1,8 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm, widgets
 
 from .models import Comment, Post
+from .uploads import normalize_image
 
 
 class PostForm(ModelForm):
@@ -18,6 +20,15 @@ class PostForm(ModelForm):
             })
         }
 
+    def clean_image(self):
+        """
+        Новая картинка проверяется и пересохраняется перед записью.
+        """
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(ModelForm):
     """
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.db import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL)',
+    'CREATE INDEX post_author_idx ON post (author_id, pub_date)',
+    'CREATE TABLE counter (user_id INTEGER PRIMARY KEY, posts INTEGER)',
+)
+
+
+def create_database():
+    """Временный файл базы со схемой замера."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.sqlite3')
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+    return path
+
+
+def remove_database(path):
+    """Удаляет файл базы вместе с журналами WAL и каталогом."""
+    directory = os.path.dirname(path)
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+def connect(path, pragmas, timeout):
+    connection = sqlite3.connect(
+        path, timeout=timeout, isolation_level=None,
+        check_same_thread=False
+    )
+    apply_pragmas(connection.cursor(), pragmas)
+    return connection
+
+
+def write_post(connection, author_id):
+    # Как new_post: пост и счётчик автора в одной транзакции,
+    # первым идёт INSERT, поэтому блокировка записи берётся
+    # сразу и ждёт busy_timeout, а не падает.
+    connection.execute('BEGIN')
+    connection.execute(
+        'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+        (author_id, 'Текст поста ' * 20, time.time())
+    )
+    connection.execute(
+        'INSERT OR REPLACE INTO counter VALUES (?, '
+        'COALESCE((SELECT posts FROM counter WHERE user_id = ?), 0) + 1)',
+        (author_id, author_id)
+    )
+    connection.execute('COMMIT')
+
+
+def writer(connection, author_id, deadline, stats, lock):
+    """Создаёт посты до deadline, считая удачные записи и ошибки."""
+    done = failed = 0
+    while time.monotonic() < deadline:
+        try:
+            write_post(connection, author_id)
+            done += 1
+        except sqlite3.OperationalError:
+            failed += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+    connection.close()
+    with lock:
+        stats['writes'] += done
+        stats['errors'] += failed
+
+
+def reader(connection, deadline, stats, lock):
+    """Читает первую страницу ленты до deadline."""
+    done = 0
+    while time.monotonic() < deadline:
+        try:
+            connection.execute(
+                'SELECT id, text FROM post ORDER BY pub_date DESC LIMIT 10'
+            ).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            pass
+    connection.close()
+    with lock:
+        stats['reads'] += done
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность записи SQLite при '
+        'конкурентных писателях и читателях: настройки по умолчанию '
+        'против SQLITE_PRAGMAS. Работает на временном файле.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers', type=int, default=8,
+            help='Потоков, создающих посты.'
+        )
+        parser.add_argument(
+            '--readers', type=int, default=8,
+            help='Потоков, читающих ленту.'
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность замера для каждого профиля.'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=5,
+            help='Ожидание блокировки без настроек, секунд.'
+        )
+
+    def handle(self, *args, **options):
+        profiles = (
+            ('default', {}, options['timeout']),
+            ('tuned', settings.SQLITE_PRAGMAS,
+             settings.SQLITE_PRAGMAS.get('busy_timeout', 0) / 1000),
+        )
+        self.stdout.write(
+            'профиль    записей/с  ошибок блокировки  чтений/с'
+        )
+        for name, pragmas, timeout in profiles:
+            writes, errors, reads = self.measure(pragmas, timeout, options)
+            self.stdout.write(
+                f'{name:<10} {writes:>9.0f}  {errors:>17}  {reads:>8.0f}'
+            )
+
+    def measure(self, pragmas, timeout, options):
+        path = create_database()
+        stats = {'writes': 0, 'errors': 0, 'reads': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+        threads = [
+            threading.Thread(target=writer, args=(
+                connect(path, pragmas, timeout), number, deadline,
+                stats, lock
+            ))
+            for number in range(options['writers'])
+        ] + [
+            threading.Thread(target=reader, args=(
+                connect(path, pragmas, timeout), deadline, stats, lock
+            ))
+            for _ in range(options['readers'])
+        ]
+        started = time.monotonic()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            elapsed = time.monotonic() - started
+            remove_database(path)
+        return (
+            stats['writes'] / elapsed, stats['errors'],
+            stats['reads'] / elapsed
+        )
@@ -0,0 +1,121 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from posts.models import Follow, Post, TimelineEntry, User, UserCounter
+from posts.timeline import TimelinePaginator
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию с тестовыми данными."""
+
+
+def parse_threshold(value):
+    return None if value == 'off' else int(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет стоимость записи и чтения ленты подписок при разных '
+        'порогах гибридной раскладки. Данные создаются в транзакции '
+        'и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--thresholds', default='off,10000,1000,100',
+            help='Пороги через запятую; off — раскладывать всех.'
+        )
+        parser.add_argument(
+            '--followers', type=int, default=5000,
+            help='Подписчиков у «тяжёлого» автора.'
+        )
+        parser.add_argument(
+            '--authors', type=int, default=20,
+            help='Обычных авторов в подписках каждого читателя.'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=20,
+            help='Постов у каждого автора.'
+        )
+        parser.add_argument(
+            '--readers', type=int, default=50,
+            help='Сколько лент прочитать для замера чтения.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            'порог      записей/пост  запись, мс/пост  чтение, мс/лента'
+        )
+        for value in options['thresholds'].split(','):
+            threshold = parse_threshold(value.strip())
+            with override_settings(TIMELINE_FANOUT_THRESHOLD=threshold):
+                write, amplification, read = self.measure(options)
+            self.stdout.write(
+                f'{value.strip():<10} {amplification:>12.1f}'
+                f'  {write:>15.2f}  {read:>16.2f}'
+            )
+
+    def measure(self, options):
+        try:
+            with transaction.atomic():
+                result = self.run_scenario(options)
+                raise Rollback
+        except Rollback:
+            pass
+        return result
+
+    def run_scenario(self, options):
+        star = User.objects.create(username='bench_star')
+        authors = User.objects.bulk_create([
+            User(username=f'bench_author_{number}')
+            for number in range(options['authors'])
+        ])
+        readers = User.objects.bulk_create([
+            User(username=f'bench_reader_{number}')
+            for number in range(options['followers'])
+        ])
+        if not readers[0].pk:
+            readers = list(User.objects.filter(
+                username__startswith='bench_reader_'
+            ))
+            authors = list(User.objects.filter(
+                username__startswith='bench_author_'
+            ))
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=star) for reader in readers]
+            + [
+                Follow(user=reader, author=author)
+                for reader in readers[:options['readers']]
+                for author in authors
+            ],
+            batch_size=settings.TIMELINE_BATCH_SIZE
+        )
+        for user in [star] + authors + readers[:options['readers']]:
+            UserCounter.rebuild(user.pk)
+
+        for author in authors:
+            for number in range(options['posts']):
+                Post.objects.create(text=f'Пост {number}', author=author)
+
+        entries = TimelineEntry.objects.count()
+        started = time.perf_counter()
+        for number in range(options['posts']):
+            Post.objects.create(text=f'Пост {number}', author=star)
+        write = (time.perf_counter() - started) * 1000 / options['posts']
+        amplification = (
+            (TimelineEntry.objects.count() - entries) / options['posts']
+        )
+
+        started = time.perf_counter()
+        for reader in readers[:options['readers']]:
+            TimelinePaginator(
+                Post.objects.all(), settings.POST_PAGE, user=reader
+            ).get_page(None)
+        read = (
+            (time.perf_counter() - started) * 1000 / options['readers']
+        )
+        return write, amplification, read
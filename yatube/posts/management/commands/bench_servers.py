@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI (синхронные view, пул '
+        'потоков) и ASGI (асинхронные view, один цикл событий) при '
+        'множестве одновременных медленных клиентов. Запросы идут к '
+        'настроенной базе без сети: каждое приложение вызывается в '
+        'процессе, медленный клиент изображается задержкой отправки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', choices=('wsgi', 'asgi'),
+            help='Замерить один сервер; без флага замеряются оба.'
+        )
+        parser.add_argument(
+            '--path', action='append',
+            help='Адрес страницы; можно несколько. По умолчанию «/».'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Сколько запросов выполнить.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='Сколько клиентов ждут ответа одновременно.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=16,
+            help='Потоков WSGI-сервера.'
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=0.2,
+            help='Сколько секунд клиент принимает ответ.'
+        )
+        parser.add_argument(
+            '--username',
+            help='Ходить от имени пользователя, мимо кэша страниц.'
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Заголовок Host, должен быть в ALLOWED_HOSTS.'
+        )
+
+    def handle(self, *args, **options):
+        options['path'] = options['path'] or ['/']
+        if options['server']:
+            measure = getattr(self, f'measure_{options["server"]}')
+            self.cookie = self.session_cookie(options['username'])
+            started = time.perf_counter()
+            statuses = measure(options)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(json.dumps({
+                'rps': options['requests'] / elapsed,
+                'errors': sum(
+                    count for status, count in statuses.items()
+                    if status >= 400
+                ),
+            }))
+            return
+        self.stdout.write('сервер  запросов/с  ошибок')
+        for server, async_views in (('wsgi', ''), ('asgi', '1')):
+            result = self.run_server(server, async_views, options)
+            self.stdout.write(
+                f'{server:<7} {result["rps"]:>10.0f}  {result["errors"]:>6}'
+            )
+
+    def run_server(self, server, async_views, options):
+        """Замер в отдельном процессе: urls читают ASYNC_VIEWS при импорте."""
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+            'bench_servers', '--server', server,
+        ]
+        for name in ('requests', 'concurrency', 'workers', 'client_delay',
+                     'username', 'host'):
+            if options[name] is not None:
+                command += [f'--{name.replace("_", "-")}', str(options[name])]
+        for path in options['path']:
+            command += ['--path', path]
+        result = subprocess.run(
+            command, capture_output=True, text=True,
+            env=dict(os.environ, ASYNC_VIEWS=async_views)
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def session_cookie(username):
+        if not username:
+            return ''
+        user = User.objects.get(username=username)
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def requests(self, options):
+        paths = options['path']
+        return (paths[number % len(paths)]
+                for number in range(options['requests']))
+
+    def measure_wsgi(self, options):
+        """
+        Потоковый WSGI-сервер: поток занят запросом, пока медленный
+        клиент не примет ответ целиком.
+        """
+        application = get_wsgi_application()
+        statuses = {}
+        lock = threading.Lock()
+
+        def request(path):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': options['host'],
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': options['host'],
+                'HTTP_COOKIE': self.cookie,
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+                'wsgi.version': (1, 0),
+            }
+            status = []
+            body = application(
+                environ, lambda line, headers: status.append(line)
+            )
+            try:
+                for _ in body:
+                    pass
+                time.sleep(options['client_delay'])
+            finally:
+                body.close()
+            with lock:
+                code = int(status[0].split()[0])
+                statuses[code] = statuses.get(code, 0) + 1
+
+        with ThreadPoolExecutor(options['workers']) as pool:
+            list(pool.map(request, self.requests(options)))
+        return statuses
+
+    def measure_asgi(self, options):
+        """
+        ASGI-сервер: пока клиент принимает ответ, цикл событий
+        обслуживает другие запросы.
+        """
+        application = get_asgi_application()
+        statuses = {}
+
+        async def request(path, semaphore):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [
+                    (b'host', options['host'].encode()),
+                    (b'cookie', self.cookie.encode()),
+                ],
+                'client': ('127.0.0.1', 0),
+                'server': (options['host'], 80),
+            }
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    code = message['status']
+                    statuses[code] = statuses.get(code, 0) + 1
+                elif not message.get('more_body'):
+                    await asyncio.sleep(options['client_delay'])
+
+            async with semaphore:
+                await application(scope, receive, send)
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            await asyncio.gather(*(
+                request(path, semaphore) for path in self.requests(options)
+            ))
+
+        asyncio.run(run())
+        return statuses
@@ -0,0 +1,74 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+# Поля строки выгрузки; import_posts читает те же поля
+FIELDS = ('id', 'text', 'pub_date', 'author', 'group', 'image')
+
+
+def detect_format(path, value):
+    if value:
+        return value
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты в JSON Lines или CSV потоком: память не растёт '
+        'с числом постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; «-» — стандартный вывод.'
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат; по умолчанию по расширению файла.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = detect_format(path, options['format'])
+        rows = Post.objects.order_by('id').values_list(
+            'id', 'text', 'pub_date', 'author__username', 'group__slug',
+            'image'
+        ).iterator(chunk_size=options['chunk_size'])
+        started = time.perf_counter()
+        if path == '-':
+            total = self.write(sys.stdout, rows, file_format)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                total = self.write(output, rows, file_format)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено постов: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.0f} в секунду)'
+        ))
+
+    def write(self, output, rows, file_format):
+        total = 0
+        if file_format == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(FIELDS)
+        for row in rows:
+            record = dict(zip(FIELDS, row))
+            record['pub_date'] = record['pub_date'].isoformat()
+            record['image'] = record['image'] or ''
+            if file_format == 'csv':
+                record['group'] = record['group'] or ''
+                writer.writerow([record[field] for field in FIELDS])
+            else:
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            total += 1
+        return total
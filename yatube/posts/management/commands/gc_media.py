@@ -0,0 +1,58 @@
+import posixpath
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import delete_image, is_recent
+
+
+def walk(storage, path):
+    """Все файлы хранилища под каталогом path."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'вместе с их превью.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=settings.MEDIA_MIN_AGE,
+            help=(
+                'Не трогать файлы моложе стольких секунд: их пост может '
+                'быть ещё не сохранён.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        if not storage.exists(field.upload_to):
+            return
+        referenced = set(
+            Post.objects.exclude(image='').exclude(image=None).values_list(
+                'image', flat=True
+            ).iterator()
+        )
+        removed = 0
+        for name in walk(storage, field.upload_to.rstrip('/')):
+            if name in referenced or is_recent(name, options['min_age']):
+                continue
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                delete_image(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без ссылок: {removed}'
+        ))
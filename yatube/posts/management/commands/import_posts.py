@@ -0,0 +1,197 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.cache import bump_versions
+from posts.models import Group, Post, User, UserCounter
+from posts.search import index_posts
+from posts.timeline import fan_out_batch
+
+from .export_posts import detect_format
+
+
+def read_records(source, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(source)
+        return
+    for number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise CommandError(f'Строка {number}: {error}')
+
+
+class Lookup:
+    """
+    Кэш id по естественному ключу (username, slug) на время импорта:
+    каждый ключ ищется в базе один раз.
+    """
+
+    def __init__(self, queryset, field, create=None):
+        self.queryset = queryset
+        self.field = field
+        self.create = create
+        self.ids = {}
+
+    def resolve(self, keys):
+        """Загружает id для ключей пачки одним запросом."""
+        missing = {key for key in keys if key and key not in self.ids}
+        if not missing:
+            return
+        self.ids.update(self.queryset.filter(
+            **{f'{self.field}__in': missing}
+        ).values_list(self.field, 'id'))
+        for key in missing - self.ids.keys():
+            self.ids[key] = self.create(key).pk if self.create else None
+
+    def get(self, key):
+        return self.ids.get(key) if key else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из JSON Lines или CSV (формат export_posts) '
+        'пачками через bulk_create. Файл читается потоком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл с постами; «-» — стандартный ввод.'
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат; по умолчанию по расширению файла.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов записывать за раз.'
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help=(
+                'Создавать неизвестных авторов и группы; без флага '
+                'такие посты пропускаются.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = detect_format(path, options['format'])
+        create = options['create_missing']
+        self.authors = Lookup(
+            User.objects, 'username',
+            User.objects.create_user if create else None
+        )
+        self.groups = Lookup(
+            Group.objects, 'slug',
+            self.create_group if create else None
+        )
+        self.imported = self.skipped = 0
+        started = time.perf_counter()
+        if path == '-':
+            self.load(sys.stdin, file_format, options['batch_size'])
+        else:
+            with open(path, encoding='utf-8', newline='') as source:
+                self.load(source, file_format, options['batch_size'])
+        if self.imported:
+            bump_versions([('feed', 'index'), ('site', 'pages')])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {self.imported}, пропущено: {self.skipped} '
+            f'за {elapsed:.1f} с '
+            f'({self.imported / max(elapsed, 1e-9):.0f} в секунду)'
+        ))
+
+    def load(self, source, file_format, batch_size):
+        records = read_records(source, file_format)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.save_batch(batch)
+
+    def save_batch(self, batch):
+        self.authors.resolve(record.get('author') for record in batch)
+        self.groups.resolve(record.get('group') for record in batch)
+        posts = []
+        for record in batch:
+            post = self.build(record)
+            if post is None:
+                self.skipped += 1
+            else:
+                posts.append(post)
+        if not posts:
+            return
+        self.insert(posts)
+        self.imported += len(posts)
+        # bulk_create не шлёт сигналов: счётчики, ленты и поисковый
+        # индекс обновляем пачкой сами.
+        for author_id, total in Counter(
+            post.author_id for post in posts
+        ).items():
+            UserCounter.bump(author_id, posts=total)
+        index_posts(posts)
+        fan_out_batch(posts)
+
+    @staticmethod
+    def insert(posts):
+        """
+        Записывает пачку и проставляет постам id и дату из файла.
+
+        bulk_create ставит pub_date (auto_now_add) текущим временем,
+        поэтому даты записываются следом одним UPDATE ... CASE.
+        """
+        dates = [post.pub_date for post in posts]
+        Post.objects.bulk_create(posts)
+        if posts[0].pk is None:
+            # SQLite не возвращает id из bulk_create. Запись в нём
+            # сериализована, а транзакция пачки держит блокировку:
+            # посты пачки — последние len(posts) строк.
+            ids = Post.objects.using(
+                router.db_for_write(Post)
+            ).order_by('-id').values_list('id', flat=True)[:len(posts)]
+            for post, pk in zip(posts, sorted(ids)):
+                post.pk = pk
+        for post, pub_date in zip(posts, dates):
+            post.pub_date = pub_date
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            pub_date=Case(
+                *[When(pk=post.pk, then=Value(post.pub_date))
+                  for post in posts],
+                output_field=DateTimeField()
+            )
+        )
+
+    def build(self, record):
+        author_id = self.authors.get(record.get('author'))
+        group_slug = record.get('group') or None
+        group_id = self.groups.get(group_slug)
+        text = record.get('text')
+        if not author_id or not text or (group_slug and not group_id):
+            return None
+        pub_date = parse_datetime(record.get('pub_date') or '')
+        if pub_date is None:
+            pub_date = timezone.now()
+        elif timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+        return Post(
+            text=text, pub_date=pub_date, author_id=author_id,
+            group_id=group_id, image=record.get('image') or None
+        )
+
+    @staticmethod
+    def create_group(slug):
+        return Group.objects.create(slug=slug, title=slug, description='')
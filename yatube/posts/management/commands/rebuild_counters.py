@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post, User, UserCounter
+
+
+def count_subquery(queryset, field):
+    """Подзапрос COUNT(*) по полю field, связанному с внешней строкой."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики комментариев, постов и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк UserCounter записывать за раз.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            posts = Post.objects.update(
+                comments_count=count_subquery(Comment.objects, 'post')
+            )
+            users = User.objects.annotate(
+                posts_total=count_subquery(Post.objects, 'author'),
+                followers_total=count_subquery(Follow.objects, 'author'),
+                following_total=count_subquery(Follow.objects, 'user'),
+            ).values_list(
+                'pk', 'posts_total', 'followers_total', 'following_total'
+            ).order_by('pk')
+            UserCounter.objects.all().delete()
+            batch = []
+            total = 0
+            for pk, posts_total, followers, following in users.iterator(
+                chunk_size=batch_size
+            ):
+                batch.append(UserCounter(
+                    user_id=pk, posts=posts_total,
+                    followers=followers, following=following
+                ))
+                if len(batch) >= batch_size:
+                    UserCounter.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            UserCounter.objects.bulk_create(batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано постов: {posts}, пользователей: {total}'
+        ))
@@ -0,0 +1,36 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из DB_REPLICAS. '
+        'Запуск по расписанию изображает репликацию с задержкой для '
+        'локальной проверки чтения с реплик.'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError(
+                'Реплики PostgreSQL получают данные репликацией, '
+                'копировать их не нужно.'
+            )
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('Реплики не настроены: задайте DB_REPLICAS.')
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in settings.REPLICA_DATABASES:
+                connections[alias].close()
+                name = connections[alias].settings_dict['NAME']
+                target = sqlite3.connect(name)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: {name}')
+        finally:
+            source.close()
@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.cache import bump_versions
+from posts.models import Post
+from posts.thumbnails import collect_variants, ready_key
+
+
+def collect(image):
+    try:
+        return collect_variants(image)
+    finally:
+        # Соединение потока с хранилищем метаданных больше не нужно.
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает превью всех картинок постов и заполняет общее '
+        'хранилище метаданных sorl-thumbnail пулом потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Сколько картинок обрабатывать параллельно.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько картинок отмечать готовыми за раз.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересобрать и картинки, уже отмеченные готовыми.'
+        )
+
+    def handle(self, *args, **options):
+        rows = Post.objects.exclude(image='').exclude(image=None).order_by(
+            'image'
+        ).values_list('image', 'id').iterator(
+            chunk_size=options['batch_size']
+        )
+        images = (
+            (name, [post_id for _, post_id in group])
+            for name, group in groupby(rows, key=lambda row: row[0])
+        )
+        total = warmed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = self.next_batch(images, options)
+                if batch is None:
+                    break
+                total += len(batch)
+                files = [Post(image=name).image for name in batch]
+                ready = {}
+                posts = []
+                for name, result in zip(
+                    batch, executor.map(collect, files)
+                ):
+                    if result is not None:
+                        ready.update(result)
+                        posts.extend(batch[name])
+                        warmed += 1
+                cache.set_many(ready, None)
+                bump_versions([('post', post_id) for post_id in posts])
+        if warmed:
+            bump_versions([('site', 'pages')])
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок без превью: {total}, собрано: {warmed}'
+        ))
+
+    def next_batch(self, images, options):
+        """
+        Следующая пачка картинок {имя: [id постов]}; уже готовые
+        пропускаются без --force. None — картинки закончились.
+        """
+        batch = {}
+        exhausted = True
+        for name, post_ids in images:
+            exhausted = False
+            batch[name] = post_ids
+            if len(batch) >= options['batch_size']:
+                break
+        if exhausted:
+            return None
+        if not options['force']:
+            variants = settings.THUMBNAIL_VARIANTS
+            found = cache.get_many([
+                ready_key(name, variant)
+                for name in batch for variant in variants
+            ])
+            batch = {
+                name: post_ids for name, post_ids in batch.items()
+                if any(
+                    ready_key(name, variant) not in found
+                    for variant in variants
+                )
+            }
+        return batch
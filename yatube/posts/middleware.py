@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .budgets import QueryBudgetExceeded, check_budget
+from .routers import PRIMARY_COOKIE, tracking_writes
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper: считает запросы и их время."""
+
+    def __init__(self):
+        self.queries = 0
+        self.time_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.time_ms += (time.perf_counter() - started) * 1000
+
+
+# Счётчик текущего запроса к серверу. Переменная контекста доходит и
+# до потоков sync_to_async, где асинхронные view работают с ORM через
+# собственные соединения
+_counter = ContextVar('query_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def install_counter(connection, **kwargs):
+    """Подключает count_query к соединению, если его там ещё нет."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class AsyncCapableMiddleware:
+    """
+    Middleware, который работает в той же манере, что и цепочка:
+    синхронно под WSGI, корутиной под ASGI без переключения потоков.
+    Наследник определяет __call__ и __acall__.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = asyncio.iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class QueryBudgetMiddleware(AsyncCapableMiddleware):
+    """
+    Сверяет число и время SQL-запросов ответа с бюджетом из
+    posts.budgets.QUERY_BUDGETS. При QUERY_BUDGET_MODE='raise'
+    превышение роняет запрос, иначе пишется в лог.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # Соединения создаются в каждом потоке заново, в том числе
+        # в потоках sync_to_async под ASGI
+        connection_created.connect(
+            install_counter, dispatch_uid='posts.install_counter'
+        )
+        for connection in connections.all():
+            install_counter(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            _counter.reset(token)
+        return self.check(request, response, counter)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _counter.reset(token)
+        return self.check(request, response, counter)
+
+    def check(self, request, response, counter):
+        match = request.resolver_match
+        if match is None:
+            return response
+        message = check_budget(
+            match.url_name, counter.queries, counter.time_ms
+        )
+        if message is not None:
+            if settings.QUERY_BUDGET_MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class ReadYourWritesMiddleware(AsyncCapableMiddleware):
+    """
+    Если запрос что-то записал (посты, комментарии, подписки отмечают
+    запись через note_write), ставит cookie PRIMARY_COOKIE на
+    REPLICA_LAG секунд: следующие страницы пользователь читает с
+    основной базы и видит свою запись, даже если реплики от неё
+    отстают. Запись определяется по самим изменениям, а не по методу:
+    подписка и отписка, например, приходят GET-запросом.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with tracking_writes() as writes:
+            response = self.get_response(request)
+        return self.mark(response, writes)
+
+    async def __acall__(self, request):
+        with tracking_writes() as writes:
+            response = await self.get_response(request)
+        return self.mark(response, writes)
+
+    def mark(self, response, writes):
+        if writes:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=settings.REPLICA_LAG,
+                httponly=True, samesite='Lax'
+            )
+        return response
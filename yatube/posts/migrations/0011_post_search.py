@@ -0,0 +1,65 @@
+import re
+from itertools import islice
+
+import snowballstemmer
+from django.db import migrations
+
+# Копии значений из posts.search на момент миграции: миграция не
+# должна меняться вместе с модулем
+SQLITE_TABLE = 'posts_post_search'
+POSTGRES_CONFIG = 'russian'
+POSTGRES_INDEX = 'post_text_search_idx'
+WORD_RE = re.compile(r'\w+')
+BATCH_SIZE = 1000
+
+
+def stem(stemmer, text):
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return ' '.join(stemmer.stemWords(words))
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SQLITE_TABLE} USING fts5("
+            f"text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        Post = apps.get_model('posts', 'Post')
+        stemmer = snowballstemmer.stemmer('russian')
+        rows = Post.objects.values_list('pk', 'text').iterator()
+        with schema_editor.connection.cursor() as cursor:
+            while True:
+                batch = list(islice(rows, BATCH_SIZE))
+                if not batch:
+                    break
+                cursor.executemany(
+                    f'INSERT INTO {SQLITE_TABLE} (rowid, text) '
+                    f'VALUES (%s, %s)',
+                    [(pk, stem(stemmer, text)) for pk, text in batch]
+                )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX {POSTGRES_INDEX} ON posts_post USING GIN "
+            f"(to_tsvector('{POSTGRES_CONFIG}'::regconfig, "
+            f"COALESCE(text, '')))"
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {SQLITE_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX {POSTGRES_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
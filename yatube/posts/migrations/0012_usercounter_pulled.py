@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is None:
+        return
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(followers__gte=threshold).update(pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='pulled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F
+
+from .storage import post_image_storage
 
 User = get_user_model()
 
@@ -18,6 +21,27 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    """
+    Запросы постов.
+    """
+    # Поля, которые показывает карточка поста (includes/post_item.html)
+    FEED_FIELDS = (
+        'id', 'text', 'pub_date', 'image', 'comments_count',
+        'author__id', 'author__username', 'group__id', 'group__slug',
+        'group__title',
+    )
+
+    def for_feed(self):
+        """
+        Посты для лент: автор и группа одним запросом, только поля
+        карточки. Число комментариев берётся из comments_count.
+        """
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS
+        )
+
+
 class Post(models.Model):
     """
     Модель поста.
@@ -28,18 +52,51 @@ class Post(models.Model):
                                related_name="posts")
     group = models.ForeignKey(Group, on_delete=models.SET_NULL,
                               blank=True, null=True, related_name="groups")
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', blank=True, null=True,
+                              storage=post_image_storage, db_index=True)
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         """
         Дефолтная сортировка по дате(от послденего).
+        Индексы повторяют ключ курсорной пагинации (pub_date, id).
         """
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
 
 
+class CommentQuerySet(models.QuerySet):
+    """
+    Запросы комментариев.
+    """
+
+    def for_post(self, post):
+        """Комментарии поста вместе с авторами одним запросом."""
+        return self.filter(post=post).select_related('author').only(
+            'id', 'text', 'created', 'post_id',
+            'author__id', 'author__username'
+        )
+
+
 class Comment(models.Model):
     """
     Модель комментариев.
@@ -53,9 +110,17 @@ class Comment(models.Model):
     text = models.TextField(verbose_name='Текст комментария')
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         """Дефолтная сортировка по дате(от послденего)"""
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -81,3 +146,93 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_follow'
             )
         ]
+
+
+class UserCounter(models.Model):
+    """
+    Денормализованные счётчики автора: посты, подписчики, подписки.
+    Обновляются сигналами, пересчитываются командой rebuild_counters.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='counters'
+    )
+    posts = models.PositiveIntegerField(default=0)
+    followers = models.PositiveIntegerField(default=0)
+    following = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам, а читаются при запросе:
+    # подписчиков было не меньше TIMELINE_FANOUT_THRESHOLD
+    pulled = models.BooleanField(default=False)
+
+    @classmethod
+    def calculate(cls, user_id):
+        """Точные значения счётчиков по таблицам."""
+        return {
+            'posts': Post.objects.filter(author_id=user_id).count(),
+            'followers': Follow.objects.filter(author_id=user_id).count(),
+            'following': Follow.objects.filter(user_id=user_id).count(),
+        }
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """Пересчитывает счётчики одного пользователя."""
+        counter, _ = cls.objects.update_or_create(
+            user_id=user_id, defaults=cls.calculate(user_id)
+        )
+        return counter
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+        try:
+            return cls.objects.get(user=user)
+        except cls.DoesNotExist:
+            return cls.rebuild(user.pk)
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """
+        Атомарно сдвигает счётчики на deltas. Если строки ещё нет,
+        при росте считаем её с нуля (изменение уже видно в таблицах),
+        а при уменьшении ничего не делаем: это может быть каскадное
+        удаление самого пользователя.
+        """
+        updated = cls.objects.filter(user_id=user_id).update(
+            **{name: F(name) + delta for name, delta in deltas.items()}
+        )
+        if not updated and min(deltas.values()) > 0:
+            cls.rebuild(user_id)
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись материализованной ленты подписок: пост автора, на которого
+    подписан user. pub_date продублирована из поста, чтобы лента
+    читалась по одному индексу без join с Post.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
@@ -0,0 +1,100 @@
+"""
+Версии наборов страниц для conditional_page и кэша страниц.
+
+Страница зависит только от того, что на ней показано: лента всех
+постов, страница группы, страница автора или отдельный пост. Сигналы
+сдвигают версии только тех наборов, куда попал изменённый объект.
+"""
+from .models import Follow, Group, Post, User
+
+
+def pages_item(kind, name):
+    """Пара (kind, pk) версии набора страниц."""
+    return ('pages', f'{kind}:{name}')
+
+
+def index_pages(request):
+    """Главная и поиск показывают посты всех авторов."""
+    return [pages_item('feed', 'index')]
+
+
+def group_pages(request, slug):
+    return [pages_item('group', slug)]
+
+
+def profile_pages(request, username):
+    """Посты автора и его счётчики."""
+    return [pages_item('user', username), pages_item('counters', username)]
+
+
+def post_pages(request, username, post_id):
+    """Пост с комментариями и счётчики автора."""
+    return [('post', post_id), pages_item('counters', username)]
+
+
+def comments_pages(request, username, post_id):
+    return [('post', post_id)]
+
+
+def follow_pages(request):
+    """
+    Лента подписок: посты всех авторов, на которых подписан
+    пользователь, и его счётчики — их сдвигает подписка и отписка.
+    """
+    authors = Follow.objects.filter(user=request.user).values_list(
+        'author__username', flat=True
+    )
+    return [pages_item('counters', request.user.username)] + [
+        pages_item('user', username) for username in authors
+    ]
+
+
+def post_items(post, group_ids=()):
+    """
+    Версии страниц, где показан пост: сам пост, главная, посты и
+    счётчики автора, страницы групп — текущей и переданных в group_ids
+    (прежняя группа отредактированного поста).
+    """
+    username = post.author.username
+    items = [
+        ('post', post.pk),
+        pages_item('feed', 'index'),
+        pages_item('user', username),
+        pages_item('counters', username),
+    ]
+    group_ids = {post.group_id, *group_ids} - {None}
+    if not group_ids:
+        slugs = []
+    elif group_ids == {post.group_id} and Post.group.is_cached(post):
+        slugs = [post.group.slug]
+    else:
+        slugs = Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True
+        )
+    return items + [pages_item('group', slug) for slug in slugs]
+
+
+def commented_items(post_id):
+    """Версии страниц, где виден счётчик комментариев поста."""
+    items = [('post', post_id), pages_item('feed', 'index')]
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ).first()
+    if row is None:
+        return items
+    username, slug = row
+    items.append(pages_item('user', username))
+    if slug is not None:
+        items.append(pages_item('group', slug))
+    return items
+
+
+def follow_items(follow):
+    """Счётчики автора и подписчика, а с ними и лента подписок."""
+    if Follow.user.is_cached(follow) and Follow.author.is_cached(follow):
+        usernames = [follow.user.username, follow.author.username]
+    else:
+        usernames = User.objects.filter(
+            pk__in=(follow.user_id, follow.author_id)
+        ).values_list('username', flat=True)
+    return [pages_item('counters', username) for username in usernames]
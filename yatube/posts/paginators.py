@@ -0,0 +1,295 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import get_or_build
+
+NEWER = 'n'
+OLDER = 'o'
+
+
+def encode_cursor(direction, position):
+    """
+    Кодирует позицию (pub_date, id) в непрозрачный токен для ?cursor=.
+    """
+    pub_date, pk = position
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Разбирает токен курсора. Для битого токена возвращает None.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEWER, OLDER) or pub_date is None:
+        return None
+    return direction, (pub_date, pk)
+
+
+def keyset(queryset, position, newer, limit,
+           date_field='pub_date', id_field='id'):
+    """
+    Срез queryset по ключу (date_field, id_field) от позиции position.
+
+    Условие записано как date <= d AND (date < d OR id < i), чтобы
+    индекс по дате использовался как диапазон, а не только для сортировки.
+    Результат всегда отсортирован от новых к старым.
+    """
+    date, pk = date_field, id_field
+    if position is not None:
+        pub_date, last_id = position
+        if newer:
+            queryset = queryset.filter(
+                Q(**{f'{date}__gt': pub_date})
+                | Q(**{date: pub_date, f'{pk}__gt': last_id}),
+                **{f'{date}__gte': pub_date}
+            )
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{date}__lt': pub_date})
+                | Q(**{date: pub_date, f'{pk}__lt': last_id}),
+                **{f'{date}__lte': pub_date}
+            )
+    if newer:
+        items = list(queryset.order_by(date, pk)[:limit])
+        items.reverse()
+        return items
+    return list(queryset.order_by(f'-{date}', f'-{pk}')[:limit])
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинатор по ключу (pub_date, id): без COUNT(*) и без OFFSET.
+
+    Любая страница стоит столько же, сколько первая: запрос начинается
+    с позиции курсора и читает не больше per_page + 1 строк.
+    """
+    date_field = 'pub_date'
+    id_field = 'id'
+
+    def __init__(self, object_list, per_page, cache_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def key(self, obj):
+        """Позиция объекта в ленте."""
+        return getattr(obj, self.date_field), getattr(obj, self.id_field)
+
+    def fetch(self, position, newer, limit):
+        """
+        Читает до limit объектов после позиции (или до неё, если newer).
+        Результат всегда отсортирован от новых к старым.
+        """
+        if self.cache_key and position is None:
+            return self.fetch_cached_head(limit)
+        return keyset(
+            self.object_list, position, newer, limit,
+            self.date_field, self.id_field
+        )
+
+    def fetch_cached_head(self, limit):
+        """
+        Первая страница через кэш: кэшируются только id постов, сами
+        посты читаются по первичному ключу и всегда свежие.
+        """
+        def build():
+            return keyset(
+                self.object_list.values_list(self.id_field, flat=True),
+                None, False, limit, self.date_field, self.id_field
+            )
+
+        ids = get_or_build(
+            f'{self.cache_key}:{limit}', build, settings.FEED_CACHE_TIMEOUT
+        )
+        objects = self.object_list.in_bulk(ids)
+        return [objects[pk] for pk in ids if pk in objects]
+
+    def get_page(self, cursor):
+        """
+        Возвращает страницу для токена курсора; битый или пустой
+        токен означает первую страницу.
+        """
+        decoded = decode_cursor(cursor) if cursor else None
+        direction, position = decoded or (OLDER, None)
+        newer = direction == NEWER
+        items = self.fetch(position, newer, self.per_page + 1)
+        has_more = len(items) > self.per_page
+        if newer and not has_more:
+            # Дошли до начала ленты: отдаём полную первую страницу.
+            return self.get_page(None)
+        if newer:
+            items = items[-self.per_page:]
+            has_newer, has_older = True, True
+        else:
+            items = items[:self.per_page]
+            has_newer, has_older = position is not None, has_more
+        if has_newer and items:
+            self.previous_cursor = encode_cursor(NEWER, self.key(items[0]))
+        if has_older and items:
+            self.next_cursor = encode_cursor(OLDER, self.key(items[-1]))
+        # Page считает соседние страницы через number и num_pages,
+        # поэтому подставляем «окно» из трёх страниц вместо COUNT(*).
+        number = 2 if self.previous_cursor else 1
+        self.num_pages = number + (1 if self.next_cursor else 0)
+        self.count = len(items)
+        return Page(items, number, self)
+
+
+def table_estimate(queryset):
+    """
+    Оценка числа строк таблицы по статистике PostgreSQL (pg_class),
+    без чтения таблицы. На других базах — None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц в админке.
+
+    Число строк без фильтров берётся из статистики PostgreSQL, если
+    таблица больше ADMIN_ESTIMATE_THRESHOLD строк. В остальных
+    случаях COUNT(*) выполняется не чаще раза в ADMIN_COUNT_TIMEOUT
+    секунд для одного и того же запроса.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = table_estimate(queryset)
+            if estimate is not None and (
+                estimate >= settings.ADMIN_ESTIMATE_THRESHOLD
+            ):
+                return estimate
+        digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return get_or_build(
+            f'posts:count:{digest}', queryset.count,
+            settings.ADMIN_COUNT_TIMEOUT
+        )
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Постраничный пагинатор без точного COUNT(*) на каждый запрос.
+
+    Число строк берётся из переданного count (денормализованный
+    счётчик), а без него считается не дальше PAGINATOR_COUNT_CAP + 1
+    строк и кэшируется на PAGINATOR_COUNT_TIMEOUT секунд. Для больших
+    выборок число страниц неизвестно, и номера страниц продолжаются
+    за пределом, пока в выборке есть строки.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        limit = settings.PAGINATOR_COUNT_CAP + 1
+        queryset = self.object_list
+        digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return get_or_build(
+            f'posts:count:{digest}:{limit}',
+            lambda: queryset[:limit].count(),
+            settings.PAGINATOR_COUNT_TIMEOUT
+        )
+
+    @property
+    def capped(self):
+        """Настоящее число строк больше посчитанного."""
+        return (
+            self.known_count is None
+            and self.count > settings.PAGINATOR_COUNT_CAP
+        )
+
+    @property
+    def count_display(self):
+        """Число строк для шаблона: «1000+» для обрезанного счёта."""
+        if self.capped:
+            return f'{settings.PAGINATOR_COUNT_CAP}+'
+        return str(self.count)
+
+    def validate_number(self, number):
+        """
+        При обрезанном счёте число страниц неизвестно: номер
+        проверяется только снизу, конец выборки находит page().
+        """
+        if not self.capped:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не целое число')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        """
+        Страница по номеру. Если счёт обрезан, страница читается с
+        одной лишней строкой: по ней видно, есть ли следующая, и
+        листать можно дальше предела, пока есть настоящие строки.
+        """
+        if not self.capped:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage('На странице нет постов')
+        self.num_pages = number + int(len(items) > self.per_page)
+        return self._get_page(items[:self.per_page], number, self)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.links = list(self.get_elided_page_range(page.number))
+        return page
+
+
+def paginate(request, object_list, paginator_class=CursorPaginator,
+             count=None, **kwargs):
+    """
+    Страница ленты для запроса.
+
+    По умолчанию лента листается курсором (?cursor=). Старые ссылки
+    вида ?page=N продолжают работать через CachedCountPaginator;
+    count — известное заранее число постов, если оно есть.
+    """
+    page_number = request.GET.get('page')
+    if page_number and 'cursor' not in request.GET:
+        paginator = CachedCountPaginator(
+            object_list, settings.POST_PAGE, count=count
+        )
+        return paginator.get_page(page_number)
+    paginator = paginator_class(object_list, settings.POST_PAGE, **kwargs)
+    return paginator.get_page(request.GET.get('cursor'))
@@ -0,0 +1,133 @@
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# Cookie «читать с основной базы»: ставится после записи на
+# REPLICA_LAG секунд, пока реплики могут её ещё не получить
+PRIMARY_COOKIE = 'read_primary'
+
+# Реплика, с которой читает текущий запрос; None — основная база
+_replica = ContextVar('replica', default=None)
+
+# Записи текущего запроса: список, который заводит tracking_writes,
+# а пополняет note_write. Список, а не флаг: sync_to_async выполняет
+# код в копии контекста, и новое значение оттуда не вернулось бы
+_writes = ContextVar('writes', default=None)
+
+
+class ReplicaRouter:
+    """
+    Чтения внутри use_replica идут на реплику, выбранную на весь
+    запрос; остальные чтения и все записи — на default.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный с реплики, сохраняется в основную базу
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в default
+        return True
+
+
+def note_write(label):
+    """
+    Отмечает запись пользователя (сохранение или удаление объекта
+    label) в текущем запросе.
+    """
+    writes = _writes.get()
+    if writes is not None:
+        writes.append(label)
+
+
+@contextmanager
+def tracking_writes():
+    """Собирает отметки note_write внутри блока в список."""
+    writes = []
+    token = _writes.set(writes)
+    try:
+        yield writes
+    finally:
+        _writes.reset(token)
+
+
+def read_primary():
+    """
+    Оставшиеся чтения запроса, включая рендер шаблона и потоковый
+    ответ, идут на основную базу.
+    """
+    _replica.set(None)
+
+
+def reading_from_replica(request):
+    """Можно ли читать для запроса с реплики."""
+    return bool(
+        settings.REPLICA_DATABASES
+        and request.method in ('GET', 'HEAD')
+        and PRIMARY_COOKIE not in request.COOKIES
+    )
+
+
+def on_replica(iterator, alias):
+    """Перебирает iterator, направляя его чтения на реплику alias."""
+    iterator = iter(iterator)
+    while True:
+        token = _replica.set(alias)
+        try:
+            part = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _replica.reset(token)
+        yield part
+
+
+def use_replica(view):
+    """
+    Направляет чтения view на случайную реплику из REPLICA_DATABASES.
+
+    Запись, небезопасные методы и запросы в течение REPLICA_LAG секунд
+    после собственной записи пользователя (cookie PRIMARY_COOKIE,
+    ставит ReadYourWritesMiddleware по note_write) остаются на
+    основной базе.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not reading_from_replica(request):
+                return await view(request, *args, **kwargs)
+            # sync_to_async копирует контекст, так что ORM в потоках
+            # видит ту же реплику
+            token = _replica.set(random.choice(settings.REPLICA_DATABASES))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not reading_from_replica(request):
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(settings.REPLICA_DATABASES))
+        try:
+            response = view(request, *args, **kwargs)
+            # TemplateResponse рендерится, а потоковый ответ читается
+            # уже после view; их запросы должны попасть на ту же реплику
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            if response.streaming:
+                response.streaming_content = on_replica(
+                    response.streaming_content, _replica.get()
+                )
+            return response
+        finally:
+            _replica.reset(token)
+    return wrapper
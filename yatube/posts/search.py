@@ -0,0 +1,80 @@
+import re
+
+import snowballstemmer
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+# Таблица FTS5 для SQLite: rowid — id поста, text — основы слов
+SQLITE_TABLE = 'posts_post_search'
+# Конфигурация полнотекстового поиска PostgreSQL
+POSTGRES_CONFIG = 'russian'
+
+WORD_RE = re.compile(r'\w+')
+
+_stemmer = snowballstemmer.stemmer('russian')
+
+
+def stem(text):
+    """
+    Основы слов текста в нижнем регистре: «пост» и «посты» дают
+    одну основу.
+    """
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return _stemmer.stemWords(words)
+
+
+def fts_query(text):
+    """Запрос FTS5: все основы из строки поиска, каждая как префикс."""
+    return ' AND '.join(f'"{word}"*' for word in stem(text))
+
+
+def index_posts(posts):
+    """Добавляет посты в индекс SQLite или обновляет их записи."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {SQLITE_TABLE} (rowid, text) '
+            f'VALUES (%s, %s)',
+            [(post.pk, ' '.join(stem(post.text))) for post in posts]
+        )
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def unindex_post(post):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [post.pk]
+        )
+
+
+def search(queryset, text):
+    """
+    Посты queryset, в которых есть все слова строки поиска.
+
+    SQLite ищет по таблице FTS5, которую обновляют сигналы Post.
+    PostgreSQL — по GIN-индексу на to_tsvector('russian', text),
+    его обновлять не нужно. Остальные базы читают таблицу целиком.
+    """
+    if connection.vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_TABLE} '
+            f'WHERE {SQLITE_TABLE} MATCH %s',
+            [query]
+        ))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+        return queryset.annotate(
+            search=SearchVector('text', config=POSTGRES_CONFIG)
+        ).filter(search=SearchQuery(text, config=POSTGRES_CONFIG))
+    for word in WORD_RE.findall(text):
+        queryset = queryset.filter(text__icontains=word)
+    return queryset
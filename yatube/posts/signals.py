@@ -0,0 +1,103 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import SITE_PAGES, bump_version, bump_versions
+from .models import Comment, Follow, Group, Post, UserCounter
+from .pages import commented_items, follow_items, post_items
+from .routers import note_write
+from .search import index_post, unindex_post
+from .thumbnails import release
+from .timeline import backfill, fan_out, follower_lost, get_timeline
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        UserCounter.bump(instance.author_id, posts=1)
+        fan_out(instance)
+    index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserCounter.bump(instance.author_id, posts=-1)
+    get_timeline().remove(instance)
+    release(instance.image.name)
+    unindex_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=F('comments_count') - 1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        UserCounter.bump(instance.author_id, followers=1)
+        UserCounter.bump(instance.user_id, following=1)
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserCounter.bump(instance.author_id, followers=-1)
+    UserCounter.bump(instance.user_id, following=-1)
+    get_timeline().prune(instance.user_id, instance.author_id)
+    follower_lost(instance.author_id)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Группа до редактирования: со страницы прежней группы пост уходит
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, created=True, **kwargs):
+    items = post_items(instance, {instance._loaded_group_id})
+    if created:
+        items.append(('feed', 'index'))
+    bump_versions(items)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_versions(commented_items(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_version('group', instance.pk)
+    bump_version(*SITE_PAGES)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    bump_versions(follow_items(instance))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def content_written(sender, **kwargs):
+    note_write(sender._meta.label)
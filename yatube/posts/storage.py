@@ -0,0 +1,46 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — sha256 его содержимого.
+
+    Одинаковые загрузки получают одно имя и лежат на диске одним
+    файлом, поэтому и превью у них общие. Файл не удаляется вместе
+    с постом: на него могут ссылаться другие посты, см.
+    posts.thumbnails.release.
+
+    Повторная загрузка обновляет время изменения файла, чтобы его
+    не удалили, пока пост с новой ссылкой ещё не сохранён
+    (MEDIA_MIN_AGE).
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest[2:4],
+            f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+post_image_storage = ContentAddressedStorage()
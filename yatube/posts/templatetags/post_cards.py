@@ -0,0 +1,27 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cache import render_cards
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_item.html'
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """
+    Карточки постов с кэшированием каждой карточки отдельно.
+    """
+    card = context.template.engine.get_template(CARD_TEMPLATE)
+
+    def render(post):
+        with context.push(post=post):
+            return card.render(context)
+
+    return mark_safe(render_cards(posts, render, context['user']))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return post_cards(context, [post])
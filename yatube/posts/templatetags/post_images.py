@@ -0,0 +1,50 @@
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import ready_variant, schedule
+
+register = template.Library()
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+
+def srcset(renditions):
+    return ', '.join(f'{url} {width}w' for width, url in renditions)
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post, variant):
+    """
+    <picture> с вариантами превью поста: современные форматы идут
+    источниками <source>, последний формат из настроек — запасной
+    <img> со srcset. Браузер сам выбирает формат и ширину.
+
+    Если превью ещё не собраны, ставит сборку в фон и отдаёт
+    заглушку с теми же пропорциями.
+    """
+    config = settings.THUMBNAIL_VARIANTS[variant]
+    width, height = config['size']
+    context = {'width': width, 'height': height, 'sizes': config['sizes']}
+    renditions = ready_variant(post.image, variant)
+    if not renditions:
+        if post.image:
+            schedule(post)
+        return context
+    formats = list(renditions)
+    fallback = renditions[formats[-1]]
+    context.update({
+        'sources': [
+            {'type': MIME_TYPES[image_format],
+             'srcset': srcset(renditions[image_format])}
+            for image_format in formats[:-1]
+        ],
+        'src': fallback[-1][1],
+        'srcset': srcset(fallback),
+    })
+    return context
@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for number in range(5):
+            Post.objects.create(
+                text=f'Пост номер {number}', author=cls.admin,
+                group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def changelist(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), params
+            )
+        self.assertEqual(response.status_code, 200)
+        counts = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT COUNT(*)')
+        ]
+        return response, counts
+
+    def test_changelist_without_repeated_counts(self):
+        """
+        Список постов считает строки один раз, повторно — из кэша;
+        авторы и группы читаются тем же запросом, что и посты.
+        """
+        response, counts = self.changelist()
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.context['cl'].result_count, 5)
+        response, counts = self.changelist()
+        self.assertEqual(counts, [])
+        self.assertEqual(response.context['cl'].result_count, 5)
+        with self.assertNumQueries(0):
+            for post in response.context['cl'].result_list:
+                post.author.username, post.group.title
+
+    def test_search_uses_index(self):
+        """
+        Поиск в админке идёт через полнотекстовый индекс.
+        """
+        response, _ = self.changelist(q='номер 3')
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Пост номер 3']
+        )
+
+    def test_foreign_keys_use_autocomplete(self):
+        """
+        Автор и группа выбираются автодополнением, а не списком
+        всех строк.
+        """
+        response = self.client.get(reverse('admin:posts_post_add'))
+        form = response.context['adminform'].form
+        for field in ('author', 'group'):
+            with self.subTest(field=field):
+                self.assertEqual(
+                    type(form.fields[field].widget.widget).__name__,
+                    'AutocompleteSelect'
+                )
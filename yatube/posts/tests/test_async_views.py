@@ -0,0 +1,72 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from posts import async_views, views
+from posts.models import Follow, Group, Post, User
+
+
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        cls.post = Post.objects.create(
+            text='Асинхронный пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def call(self, view, path, user, *args, **kwargs):
+        cache.clear()
+        request = self.factory.get(path)
+        request.user = user
+        if asyncio.iscoroutinefunction(view):
+            return async_to_sync(view)(request, *args, **kwargs)
+        return view(request, *args, **kwargs)
+
+    def test_same_pages_as_sync(self):
+        """Асинхронные страницы совпадают с синхронными."""
+        pages = [
+            ('index', '/', ()),
+            ('group_posts', '/group/group/', ('group',)),
+            ('profile', '/author/', ('author',)),
+            ('post_view', f'/author/{self.post.pk}/',
+             ('author', self.post.pk)),
+        ]
+        for name, path, args in pages:
+            with self.subTest(name=name):
+                expected = self.call(
+                    getattr(views, name), path, AnonymousUser(), *args
+                )
+                response = self.call(
+                    getattr(async_views, name), path, AnonymousUser(), *args
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+    def test_follow_index(self):
+        """
+        Лента подписок показывает посты авторов, анонима отправляет
+        на вход; неизвестный автор даёт 404.
+        """
+        response = self.call(
+            async_views.follow_index, '/follow/', self.reader
+        )
+        self.assertContains(response, 'Асинхронный пост')
+        response = self.call(
+            async_views.follow_index, '/follow/', AnonymousUser()
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/auth/login/', response['Location'])
+        with self.assertRaises(Http404):
+            self.call(async_views.profile, '/nobody/', self.reader, 'nobody')
@@ -0,0 +1,120 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, TestCase, modify_settings,
+                         override_settings)
+from django.urls import resolve, reverse
+
+from posts.budgets import QUERY_BUDGETS, QueryBudget, QueryBudgetExceeded
+from posts.middleware import QueryBudgetMiddleware
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.utils import QueryBudgetMixin
+from posts.urls import urlpatterns
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(settings.POST_PAGE + 1):
+            cls.post = Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_every_url_has_budget(self):
+        """
+        Для каждого URL из posts/urls.py объявлен бюджет.
+        """
+        for pattern in urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIn(pattern.name, QUERY_BUDGETS)
+
+    def test_views_within_budget(self):
+        """
+        Каждый view укладывается в бюджет запросов с холодным кэшем.
+        """
+        post = {'username': self.author.username, 'post_id': self.post.pk}
+        author = {'username': self.author.username}
+        requests = [
+            ('index', {}, 'get', None),
+            ('follow_index', {}, 'get', None),
+            ('group_posts', {'slug': self.group.slug}, 'get', None),
+            ('search', {}, 'get', {'q': 'пост'}),
+            ('profile', author, 'get', None),
+            ('post', post, 'get', None),
+            ('post_comments', post, 'get', None),
+            ('new_post', {}, 'get', None),
+            ('post_edit', post, 'get', None),
+            ('add_comment', post, 'post', {'text': 'Текст'}),
+            ('profile_unfollow', author, 'get', None),
+            ('profile_follow', author, 'get', None),
+        ]
+        clients = (self.guest_client, self.reader_client, self.author_client)
+        for name, kwargs, method, data in requests:
+            for client in clients:
+                with self.subTest(name=name, client=client):
+                    cache.clear()
+                    url = reverse(name, kwargs=kwargs)
+                    self.assertWithinBudget(
+                        name, lambda: getattr(client, method)(url, data)
+                    )
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    @modify_settings(MIDDLEWARE={
+        'append': 'posts.middleware.QueryBudgetMiddleware'
+    })
+    def test_middleware_raises_over_budget(self):
+        """
+        Middleware в режиме raise роняет ответ сверх бюджета.
+        """
+        with mock.patch.dict(QUERY_BUDGETS, {'index': QueryBudget(0, 0)}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.guest_client.get(reverse('index'))
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_async_middleware_counts_thread_queries(self):
+        """
+        Под ASGI middleware остаётся корутиной и считает запросы,
+        сделанные в потоке sync_to_async через его собственное
+        соединение.
+        """
+        def query():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            finally:
+                connection.close()
+
+        async def view(request):
+            await sync_to_async(query, thread_sensitive=False)()
+            return HttpResponse()
+
+        middleware = QueryBudgetMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().get(reverse('index'))
+        request.resolver_match = resolve(request.path)
+        with mock.patch.dict(QUERY_BUDGETS, {'index': QueryBudget(0, 100)}):
+            with self.assertRaises(QueryBudgetExceeded):
+                async_to_sync(middleware)(request)
+        with mock.patch.dict(QUERY_BUDGETS, {'index': QueryBudget(1, 100)}):
+            async_to_sync(middleware)(request)
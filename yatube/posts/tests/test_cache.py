@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts.cache import get_or_build
+
+
+class GetOrBuildTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def build(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_cached(self):
+        """
+        Пока ключ свежий, build не вызывается повторно.
+        """
+        self.assertEqual(get_or_build('key', self.build, 60, beta=0), 1)
+        self.assertEqual(get_or_build('key', self.build, 60, beta=0), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_locked(self):
+        """
+        Пока другой процесс пересчитывает ключ, отдаётся старое значение.
+        """
+        cache.set('key', ('старое', 1.0, time.time() - 1), 60)
+        cache.add('key:lock', 'other', 60)
+        self.assertEqual(get_or_build('key', self.build, 60), 'старое')
+        self.assertEqual(self.calls, 0)
+
+    def test_early_recompute(self):
+        """
+        С большим beta ключ пересчитывается до истечения срока.
+        """
+        cache.set('key', ('старое', 1.0, time.time() + 30), 60)
+        self.assertEqual(get_or_build('key', self.build, 60, beta=1e6), 1)
+        self.assertEqual(get_or_build('key', self.build, 60, beta=0), 1)
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.models import Follow, Group, Post, TimelineEntry, User
+from posts.search import search
+
+
+class ImportExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        self.date = datetime(2020, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_jsonl(self, name, records):
+        with open(self.path(name), 'w', encoding='utf-8') as output:
+            for record in records:
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return self.path(name)
+
+    def call(self, *args, **options):
+        out = StringIO()
+        call_command(*args, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_roundtrip(self):
+        """
+        Выгруженные в JSONL и CSV посты загружаются обратно с теми же
+        датами, авторами и группами.
+        """
+        Post.objects.create(text='Первый', author=self.author)
+        Post.objects.create(
+            text='Второй, с запятой', author=self.author, group=self.group
+        )
+        expected = sorted(Post.objects.values_list(
+            'text', 'pub_date', 'author_id', 'group_id'
+        ))
+        for name in ('posts.jsonl', 'posts.csv'):
+            with self.subTest(name=name):
+                self.call('export_posts', self.path(name))
+                Post.objects.all().delete()
+                output = self.call(
+                    'import_posts', self.path(name), batch_size=1
+                )
+                self.assertIn('Загружено постов: 2, пропущено: 0', output)
+                self.assertEqual(sorted(Post.objects.values_list(
+                    'text', 'pub_date', 'author_id', 'group_id'
+                )), expected)
+
+    def test_import_updates_derived_data(self):
+        """
+        Загруженные посты попадают в счётчики, ленты подписчиков
+        и поисковый индекс, хотя bulk_create не шлёт сигналов.
+        """
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': f'Импорт {number}', 'author': 'author',
+             'pub_date': self.date.isoformat()}
+            for number in range(5)
+        ])
+        self.call('import_posts', path, batch_size=2)
+        self.assertEqual(self.author.counters.posts, 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+        self.assertEqual(
+            search(Post.objects.all(), 'импорт').count(), 5
+        )
+        self.assertEqual(
+            set(Post.objects.values_list('pub_date', flat=True)),
+            {self.date}
+        )
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=3)
+    def test_import_fans_out_per_author(self):
+        """
+        Импорт раскладывает посты по лентам подписчиков каждого
+        автора и пропускает авторов, которых читают при запросе.
+        """
+        popular = User.objects.create(username='popular')
+        other = User.objects.create(username='other')
+        fan = User.objects.create(username='fan')
+        for user in (self.reader, other, fan):
+            Follow.objects.create(user=user, author=popular)
+        Follow.objects.create(user=other, author=self.author)
+        site_post = Post.objects.create(text='С сайта', author=self.author)
+        TimelineEntry.objects.all().delete()
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': f'Импорт {number}', 'author': author}
+            for number in range(3)
+            for author in ('author', 'popular')
+        ])
+        self.call('import_posts', path, batch_size=4)
+        for user in (self.reader, other):
+            self.assertEqual(set(TimelineEntry.objects.filter(
+                user=user
+            ).values_list('post__text', 'author_id')), {
+                (f'Импорт {number}', self.author.pk) for number in range(3)
+            })
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=site_post).exists()
+        )
+
+    def test_unknown_author_and_group(self):
+        """
+        Посты неизвестных авторов и групп пропускаются, с
+        --create-missing авторы и группы создаются.
+        """
+        path = self.write_jsonl('posts.jsonl', [
+            {'text': 'Пост', 'author': 'stranger'},
+            {'text': 'Пост', 'author': 'author', 'group': 'unknown'},
+            {'text': 'Пост', 'author': 'author', 'group': 'group'},
+        ])
+        output = self.call('import_posts', path)
+        self.assertIn('Загружено постов: 1, пропущено: 2', output)
+        output = self.call('import_posts', path, create_missing=True)
+        self.assertIn('Загружено постов: 3, пропущено: 0', output)
+        self.assertTrue(User.objects.filter(username='stranger').exists())
+        self.assertTrue(Group.objects.filter(slug='unknown').exists())
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+
+
+class SQLitePragmasTests(TestCase):
+    def test_pragmas_applied(self):
+        """Новое соединение SQLite получает настройки SQLITE_PRAGMAS."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLITE_PRAGMAS применяются только к SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute('PRAGMA temp_store')
+            temp_store = cursor.fetchone()[0]
+        self.assertEqual(
+            busy_timeout, settings.SQLITE_PRAGMAS['busy_timeout']
+        )
+        # temp_store = memory хранится как 2
+        self.assertEqual(temp_store, 2)
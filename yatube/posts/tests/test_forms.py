@@ -1,6 +1,13 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Post, User
 
@@ -78,3 +85,86 @@ class NewPostFormTests(TestCase):
             follow=True
         )
         self.assertEqual(Post.objects.count(), post_count)
+
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_jpeg(size, orientation=None):
+    image = Image.new('RGB', size, color=(0, 120, 200))
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, 'jpeg', exif=exif)
+    return SimpleUploadedFile('photo.JPG', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, IMAGE_MASTER_SIZE=(200, 200)
+)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, image):
+        return self.client.post(
+            reverse('new_post'), {'text': 'Фото', 'image': image}
+        )
+
+    def test_image_normalized(self):
+        """
+        Картинка уменьшается до мастера, поворачивается по EXIF
+        и сохраняется без EXIF.
+        """
+        self.upload(make_jpeg((800, 400), orientation=6))
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 200))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_transparent_image_kept_as_png(self):
+        """
+        Картинка с прозрачностью пересохраняется в PNG.
+        """
+        buffer = BytesIO()
+        Image.new('RGBA', (50, 50), (0, 0, 0, 0)).save(buffer, 'png')
+        self.upload(
+            SimpleUploadedFile('logo.png', buffer.getvalue(), 'image/png')
+        )
+        post = Post.objects.get(text='Фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.mode, 'RGBA')
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        """
+        Картинка с числом пикселей больше лимита не принимается.
+        """
+        response = self.upload(make_jpeg((100, 100)))
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'
+        ))
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_too_large_file_rejected(self):
+        """
+        Файл больше лимита не принимается.
+        """
+        response = self.upload(make_jpeg((100, 100)))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'file_too_large'
+        ))
+        self.assertFalse(Post.objects.exists())
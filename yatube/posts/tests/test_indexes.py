@@ -0,0 +1,73 @@
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+FEED_TABLES = ('posts_post', 'posts_comment', 'posts_timelineentry')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN')
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            cls.post = Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group
+            )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed_queries(self, url):
+        """SELECT-запросы view к таблицам лент, первая и вторая страницы."""
+        with CaptureQueriesContext(connection) as context:
+            page = self.client.get(url).context.get('page')
+            if page is not None and page.paginator.next_cursor:
+                self.client.get(url, {'cursor': page.paginator.next_cursor})
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'ORDER BY' in query['sql']
+            and any(f'"{table}"' in query['sql'] for table in FEED_TABLES)
+        ]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_feed_queries_use_indexes(self):
+        """
+        Запросы лент и комментариев читают индекс и не сортируют
+        во временном B-дереве.
+        """
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+            reverse('post', kwargs={
+                'username': self.author.username, 'post_id': self.post.pk
+            }),
+        ]
+        for url in urls:
+            queries = self.feed_queries(url)
+            self.assertTrue(queries, url)
+            for sql in queries:
+                with self.subTest(url=url, sql=sql):
+                    plan = self.explain(sql)
+                    self.assertIn('INDEX', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
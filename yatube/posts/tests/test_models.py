@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User, UserCounter
 
 
 class GroupModelsTest(TestCase):
@@ -39,3 +42,60 @@ class PostModelsTest(TestCase):
         post = PostModelsTest.post
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post)[:15])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+
+    def counters(self, user):
+        return UserCounter.for_user(user)
+
+    def test_counters_follow_create_and_delete(self):
+        """
+        Счётчики меняются при создании и удалении постов,
+        комментариев и подписок.
+        """
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.assertEqual(self.counters(self.author).posts, 1)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author).followers, 1)
+        self.assertEqual(self.counters(self.reader).following, 1)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        follow.delete()
+        self.assertEqual(self.counters(self.author).followers, 0)
+        self.assertEqual(self.counters(self.reader).following, 0)
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts, 0)
+
+    def test_rebuild_counters_command(self):
+        """
+        Команда rebuild_counters чинит рассинхронизированные счётчики.
+        """
+        post = Post.objects.create(text='Текст', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.update(comments_count=42)
+        UserCounter.objects.update(posts=42, followers=42, following=42)
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        counters = self.counters(self.author)
+        self.assertEqual(
+            (counters.posts, counters.followers, counters.following),
+            (1, 1, 0)
+        )
+        self.assertEqual(self.counters(self.reader).following, 1)
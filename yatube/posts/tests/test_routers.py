@@ -0,0 +1,209 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.cache import conditional_page
+from posts.middleware import ReadYourWritesMiddleware
+from posts.models import Follow, Group, User
+from posts.routers import PRIMARY_COOKIE, use_replica
+
+REPLICAS = ['test_replica1', 'test_replica2']
+
+
+def served_by():
+    """
+    База, ответившая на чтение: в каждой своя группа со slug,
+    равным псевдониму базы.
+    """
+    return HttpResponse(Group.objects.values_list('slug', flat=True).get())
+
+
+@use_replica
+def read_database(request):
+    return served_by()
+
+
+@use_replica
+@conditional_page(lambda request: [('pages', 'replica')])
+def page_database(request):
+    return served_by()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Реплики — копии файла SQLite')
+class ReplicaDatabaseTests(TestCase):
+    """
+    Настоящие реплики: отдельные файлы SQLite со схемой основной
+    базы, но со своими строками, так что по ответу видно, какая
+    база его обслужила.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Псевдонимы добавляются после проверки databases тестового
+        # класса: тестовый раннер создаёт только базы из настроек
+        cls.directory = tempfile.mkdtemp()
+        for alias in REPLICAS:
+            path = os.path.join(cls.directory, f'{alias}.sqlite3')
+            replica = sqlite3.connect(path)
+            connection.connection.backup(replica)
+            replica.close()
+            connections.databases[alias] = dict(
+                connections.databases['default'], NAME=path
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in REPLICAS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        for alias in ['default', *REPLICAS]:
+            Group.objects.using(alias).create(title=alias, slug=alias)
+
+    def tearDown(self):
+        for alias in REPLICAS:
+            Group.objects.using(alias).all().delete()
+
+    @override_settings(REPLICA_DATABASES=REPLICAS, REPLICA_LAG=0)
+    def test_reads_go_to_replica(self):
+        """
+        GET-запросы читают с реплики, POST и запросы сразу после
+        своей записи — с основной базы. Запись всегда в default.
+        """
+        response = read_database(self.factory.get('/'))
+        self.assertIn(response.content.decode(), REPLICAS)
+        response = read_database(self.factory.post('/'))
+        self.assertEqual(response.content.decode(), 'default')
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = '1'
+        self.assertEqual(read_database(request).content.decode(), 'default')
+        group = Group.objects.using(REPLICAS[0]).get()
+        group.title = 'Изменено'
+        group.save()
+        self.assertFalse(
+            Group.objects.using(REPLICAS[0]).filter(title='Изменено')
+        )
+
+    @override_settings(REPLICA_DATABASES=REPLICAS[:1], REPLICA_LAG=0)
+    def test_page_from_replica(self):
+        """
+        Страница, а с ней шаблон и пагинатор, собирается с реплики:
+        группа есть только там.
+        """
+        response = self.client.get(
+            reverse('group_posts', args=[REPLICAS[0]])
+        )
+        self.assertContains(response, REPLICAS[0])
+        response = self.client.get(reverse('group_posts', args=['default']))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(REPLICA_DATABASES=REPLICAS, REPLICA_LAG=60)
+    def test_changed_page_read_from_primary(self):
+        """
+        Страница, изменённая последние REPLICA_LAG секунд, собирается
+        с основной базы: отставшая реплика не попадёт в кэш и ETag.
+        """
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(page_database(request).content.decode(), 'default')
+        with self.settings(REPLICA_LAG=0):
+            response = page_database(request)
+        self.assertIn(response.content.decode(), REPLICAS)
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_without_replicas(self):
+        """Без настроенных реплик всё читается с основной базы."""
+        Group.objects.create(title='default', slug='default')
+        response = read_database(self.factory.get('/'))
+        self.assertEqual(response.content.decode(), 'default')
+
+    @override_settings(
+        REPLICA_DATABASES=['default'], REPLICA_LAG=7,
+        MIDDLEWARE=settings.MIDDLEWARE + [
+            'posts.middleware.ReadYourWritesMiddleware'
+        ]
+    )
+    def test_read_your_writes_cookie(self):
+        """
+        После создания поста пользователь получает cookie чтения
+        с основной базы и видит пост на следующей странице.
+        """
+        user = User.objects.create_user(username='writer')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('new_post'), {'text': 'Свежий пост'}
+        )
+        cookie = response.cookies[PRIMARY_COOKIE]
+        self.assertEqual(cookie['max-age'], 7)
+        response = self.client.get(
+            reverse('profile', args=[user.username])
+        )
+        self.assertContains(response, 'Свежий пост')
+
+    @override_settings(
+        REPLICA_DATABASES=['default'],
+        MIDDLEWARE=settings.MIDDLEWARE + [
+            'posts.middleware.ReadYourWritesMiddleware'
+        ]
+    )
+    def test_cookie_set_by_write_not_method(self):
+        """
+        Cookie ставит сама запись: подписка GET-запросом её получает,
+        а POST с ошибкой в форме, ничего не записавший, — нет.
+        """
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse('profile_follow', args=[author.username])
+        )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.client.cookies.pop(PRIMARY_COOKIE)
+        response = self.client.post(reverse('new_post'), {'text': ''})
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_async_read_your_writes(self):
+        """
+        Под ASGI middleware остаётся корутиной и видит запись,
+        сделанную view в потоке sync_to_async.
+        """
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+
+        async def follow(request):
+            await sync_to_async(Follow.objects.create)(
+                user=user, author=author
+            )
+            return HttpResponse()
+
+        async def read(request):
+            return HttpResponse()
+
+        middleware = ReadYourWritesMiddleware(follow)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.get('/'))
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        middleware = ReadYourWritesMiddleware(read)
+        response = async_to_sync(middleware)(self.factory.get('/'))
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
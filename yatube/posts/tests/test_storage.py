@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+from posts.storage import post_image_storage
+from posts.thumbnails import ready_variant
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_bytes(color):
+    buffer = BytesIO()
+    Image.new('RGB', (60, 40), color=color).save(buffer, 'png')
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, MEDIA_MIN_AGE=0, THUMBNAIL_PIPELINE='sync'
+)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, content, name='photo.png'):
+        post = Post(text='Пост', author=self.user)
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_identical_uploads_share_file(self):
+        """
+        Одинаковые загрузки получают одно имя по содержимому.
+        """
+        first = self.create_post(image_bytes('red'), 'one.png')
+        second = self.create_post(image_bytes('red'), 'two.png')
+        other = self.create_post(image_bytes('blue'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w\w/\w\w/\w{64}\.png$')
+
+    def test_file_removed_with_last_post(self):
+        """
+        Файл и его превью удаляются, когда на них не ссылается
+        ни один пост.
+        """
+        first = self.create_post(image_bytes('red'))
+        second = self.create_post(image_bytes('red'))
+        path = first.image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('index'))
+        renditions = ready_variant(first.image, 'card')
+        thumbnail = os.path.join(
+            MEDIA_ROOT, renditions['JPEG'][0][1][len(settings.MEDIA_URL):]
+        )
+        self.assertTrue(os.path.exists(thumbnail))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(thumbnail))
+        self.assertIsNone(ready_variant(second.image, 'card'))
+
+    def test_edit_releases_previous_image(self):
+        """
+        После замены картинки при редактировании старый файл удаляется.
+        """
+        post = self.create_post(image_bytes('red'))
+        path = post.image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('post_edit', args=[self.user.username, post.pk]),
+                {'text': 'Новый текст', 'image': ContentFile(
+                    image_bytes('green'), name='new.png'
+                )}
+            )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.path, path)
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(MEDIA_MIN_AGE=3600)
+    def test_reupload_survives_release(self):
+        """
+        Файл, загруженный повторно, пока удалялся последний пост с ним,
+        не удаляется; старый файл без ссылок удаляется.
+        """
+        post = self.create_post(image_bytes('red'))
+        name = post.image.name
+        path = post.image.path
+        hour_ago = time.time() - 2 * 3600
+        os.utime(path, (hour_ago, hour_ago))
+        with self.captureOnCommitCallbacks() as callbacks:
+            post.delete()
+        again = post_image_storage.save(
+            'posts/again.png', ContentFile(image_bytes('red'))
+        )
+        self.assertEqual(again, name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(os.path.exists(path))
+
+        os.utime(path, (hour_ago, hour_ago))
+        post = self.create_post(image_bytes('red'))
+        os.utime(path, (hour_ago, hour_ago))
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_gc_removes_orphans(self):
+        """
+        gc_media удаляет файлы без постов и не трогает остальные.
+        """
+        post = self.create_post(image_bytes('red'))
+        orphan = post_image_storage.save(
+            'posts/orphan.png', ContentFile(image_bytes('black'))
+        )
+        call_command('gc_media', min_age=0, stdout=StringIO())
+        self.assertTrue(post_image_storage.exists(post.image.name))
+        self.assertFalse(post_image_storage.exists(orphan))
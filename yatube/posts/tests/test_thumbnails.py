@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils.functional import empty
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts.models import Post, User
+from posts.thumbnails import ready_variant, schedule
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def reset_sorl():
+    """
+    sorl создаёт хранилище и kvstore один раз на процесс, и хранилище
+    запоминает MEDIA_ROOT того теста, где его создали. Сброс заставляет
+    собрать их заново под текущие настройки и очищает кэш метаданных.
+    """
+    default.storage._wrapped = empty
+    default.kvstore._wrapped = empty
+    caches[settings.THUMBNAIL_CACHE].clear()
+
+
+def make_image(name='image.png', color=(200, 0, 0)):
+    buffer = BytesIO()
+    Image.new('RGB', (120, 80), color=color).save(buffer, 'png')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_PIPELINE='sync')
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        reset_sorl()
+        self.addCleanup(reset_sorl)
+        self.user = User.objects.create(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_variants_rendered_after_save(self):
+        """
+        Пост с картинкой из формы получает готовые превью после коммита,
+        и лента показывает картинку вместо заглушки.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('new_post'),
+                {'text': 'Пост с картинкой', 'image': make_image()}
+            )
+        post = Post.objects.get(text='Пост с картинкой')
+        renditions = ready_variant(post.image, 'card')
+        self.assertIsNotNone(renditions)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, f'src="{renditions["JPEG"][-1][1]}"')
+
+    def test_responsive_variants(self):
+        """
+        Каждый формат собран во всех ширинах, WebP идёт источником
+        <picture>, JPEG — запасным <img> со srcset.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=make_image()
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('index'))
+        renditions = ready_variant(post.image, 'card')
+        widths = settings.THUMBNAIL_VARIANTS['card']['widths']
+        self.assertIn('WEBP', renditions)
+        self.assertEqual(list(renditions)[-1], 'JPEG')
+        for image_format, items in renditions.items():
+            self.assertEqual([width for width, _ in items], list(widths))
+        self.assertTrue(renditions['WEBP'][0][1].endswith('.webp'))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(
+            response, f'{renditions["JPEG"][0][1]} {widths[0]}w'
+        )
+
+    def test_placeholder_until_ready(self):
+        """
+        Пока превью не собрано, страница отдаёт заглушку и не
+        обрабатывает исходник в запросе.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=make_image()
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.get(reverse('index'))
+        self.assertNotContains(response, '<img class="card-img"')
+        self.assertContains(response, 'aspect-ratio: 960 / 500')
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(ready_variant(post.image, 'card'))
+
+    def test_broken_source_not_rescheduled(self):
+        """
+        Картинка без исходника не ставится в сборку снова при
+        каждом показе, пока не истечёт THUMBNAIL_FAILURE_TIMEOUT.
+        """
+        post = Post.objects.create(
+            text='Пост', author=self.user,
+            image=make_image('broken.png', color=(0, 0, 200))
+        )
+        os.remove(post.image.path)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            schedule(post)
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(ready_variant(post.image, 'card'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule(post)
+        self.assertEqual(callbacks, [])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class WarmThumbnailsTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        reset_sorl()
+        self.addCleanup(reset_sorl)
+        self.user = User.objects.create(username='author')
+
+    def test_warm_all_images(self):
+        """
+        warm_thumbnails собирает превью всех картинок, одинаковые
+        картинки обрабатываются один раз, готовые пропускаются.
+        """
+        first = Post.objects.create(
+            text='Пост', author=self.user, image=make_image()
+        )
+        Post.objects.create(text='Копия', author=self.user, image=first.image)
+        Post.objects.create(text='Без картинки', author=self.user)
+        out = StringIO()
+        call_command('warm_thumbnails', workers=2, stdout=out)
+        self.assertIn('Картинок без превью: 1, собрано: 1', out.getvalue())
+        renditions = ready_variant(first.image, 'card')
+        thumbnail = os.path.join(
+            MEDIA_ROOT, renditions['WEBP'][0][1][len(settings.MEDIA_URL):]
+        )
+        self.assertTrue(os.path.exists(thumbnail))
+        out = StringIO()
+        call_command('warm_thumbnails', stdout=out)
+        self.assertIn('Картинок без превью: 0, собрано: 0', out.getvalue())
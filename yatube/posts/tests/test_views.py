@@ -6,10 +6,14 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post, User
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          User)
+from posts.timeline import get_timeline
 
 User = get_user_model()
 
@@ -56,6 +60,7 @@ class PostPagesTests(TestCase):
         super().tearDownClass()
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -197,14 +202,30 @@ class PostPagesTests(TestCase):
 
     def test_index_cached(self):
         """
-        Проверка работы кэша на главной странице.
+        Карточки постов берутся из кэша, пока не изменится версия поста.
         """
-        response_start = self.guest_client.get(reverse('index'))
-        response_test_cache = self.guest_client.get(reverse('index'))
-        cache.clear()
-        response_three = self.guest_client.get(reverse('index'))
-        self.assertEqual(response_start.content, response_test_cache.content)
-        self.assertNotEqual(response_start.content, response_three.content)
+        self.guest_client.get(reverse('index'))
+        Post.objects.filter(pk=PostPagesTests.post1.pk).update(
+            text='Текст мимо сигналов'
+        )
+        response_cached = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response_cached, 'Текст мимо сигналов')
+        post = Post.objects.get(pk=PostPagesTests.post1.pk)
+        post.text = 'Новый текст поста'
+        post.save()
+        response_fresh = self.guest_client.get(reverse('index'))
+        self.assertContains(response_fresh, 'Новый текст поста')
+
+    def test_comment_invalidates_card(self):
+        """
+        Новый комментарий сбрасывает кэш карточки поста.
+        """
+        self.guest_client.get(reverse('index'))
+        Comment.objects.create(
+            post=PostPagesTests.post2, author=self.second, text='Текст'
+        )
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
 
     def test_authorized_client_can_subscribe(self):
         """
@@ -288,6 +309,7 @@ class PaginatorViewsTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -312,3 +334,502 @@ class PaginatorViewsTest(TestCase):
         """
         response = self.client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+    def test_cursor_pages(self):
+        """
+        Курсорная пагинация: следующая страница и возврат на первую.
+        """
+        pages = [
+            reverse('index'),
+            reverse('profile', kwargs={'username': 'test_user'}),
+            reverse('group_posts', kwargs={'slug': 'test_slug'})
+        ]
+        for url in pages:
+            with self.subTest(url=url):
+                first = self.client.get(url).context.get('page')
+                cursor = first.paginator.next_cursor
+                self.assertIsNone(first.paginator.previous_cursor)
+                second = self.client.get(
+                    url, {'cursor': cursor}
+                ).context.get('page')
+                self.assertEqual(len(second.object_list), 3)
+                self.assertIsNone(second.paginator.next_cursor)
+                self.assertTrue(second.has_previous())
+                back = self.client.get(
+                    url, {'cursor': second.paginator.previous_cursor}
+                ).context.get('page')
+                self.assertEqual(back.object_list, first.object_list)
+
+    def test_broken_cursor_shows_first_page(self):
+        """
+        Битый курсор открывает первую страницу.
+        """
+        response = self.client.get(reverse('index'), {'cursor': 'broken'})
+        self.assertEqual(len(response.context.get('page').object_list), 10)
+
+    def count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url, params)
+        return response, [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT COUNT(*)')
+        ]
+
+    def test_page_count_cached(self):
+        """
+        Число постов для ?page=N считается один раз за окно кэша,
+        у профиля берётся из счётчика автора.
+        """
+        url = reverse('group_posts', kwargs={'slug': 'test_slug'})
+        response, counts = self.count_queries(url, {'page': 2})
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.context['page'].paginator.count, 13)
+        _, counts = self.count_queries(url, {'page': 1})
+        self.assertEqual(counts, [])
+        url = reverse('profile', kwargs={'username': 'test_user'})
+        response, counts = self.count_queries(url, {'page': 2})
+        self.assertEqual(counts, [])
+        self.assertEqual(len(response.context['page'].object_list), 3)
+
+    @override_settings(PAGINATOR_COUNT_CAP=11)
+    def test_large_count_capped(self):
+        """
+        Для большой выборки счёт обрывается на пределе, шаблон
+        показывает «11+».
+        """
+        response = self.client.get(reverse('index'), {'page': 1})
+        paginator = response.context['page'].paginator
+        self.assertTrue(paginator.capped)
+        self.assertEqual(paginator.count, 12)
+        self.assertContains(response, 'Постов: 11+')
+
+    @override_settings(PAGINATOR_COUNT_CAP=5)
+    def test_pages_beyond_cap(self):
+        """
+        За пределом счёта страницы по номеру продолжаются настоящими
+        постами, пока они есть.
+        """
+        first = self.client.get(reverse('index'), {'page': 1})
+        self.assertTrue(first.context['page'].has_next())
+        self.assertContains(first, '?page=2')
+        second = self.client.get(reverse('index'), {'page': 2})
+        page = second.context['page']
+        self.assertEqual(page.number, 2)
+        self.assertEqual(len(page.object_list), 3)
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+
+class TimelineViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+        for number in range(12):
+            Post.objects.create(text=f'Пост {number}', author=cls.author)
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def feed(self, **params):
+        return self.client.get(reverse('follow_index'), params).context[
+            'page'
+        ]
+
+    def check_timeline(self):
+        self.client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}
+        ))
+        first = self.feed()
+        self.assertEqual(len(first), 10)
+        second = self.feed(cursor=first.paginator.next_cursor)
+        self.assertEqual(len(second), 2)
+        self.assertTrue(all(post.author == self.author for post in second))
+
+        new = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.feed().object_list[0], new)
+
+        self.client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(len(self.feed()), 0)
+
+    def test_database_timeline(self):
+        """
+        Лента подписок из таблицы: бэкфилл, новые посты, отписка.
+        """
+        self.check_timeline()
+
+    @override_settings(TIMELINE_BACKEND='posts.timeline.LocalTimeline')
+    def test_local_timeline(self):
+        """
+        То же самое для хранилища лент в памяти процесса.
+        """
+        get_timeline().clear()
+        self.check_timeline()
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_hybrid_timeline_pulls_popular_authors(self):
+        """
+        Посты автора над порогом не раскладываются, а читаются
+        при запросе ленты.
+        """
+        self.client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}
+        ))
+        new = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        page = self.feed()
+        self.assertEqual(len(page), 10)
+        self.assertEqual(page.object_list[0], new)
+
+    @override_settings(
+        TIMELINE_FANOUT_THRESHOLD=2, TIMELINE_PIPELINE='sync'
+    )
+    def test_author_below_threshold_keeps_posts(self):
+        """
+        Посты, написанные автором над порогом, остаются в лентах
+        подписчиков, когда после отписки автор опускается ниже порога.
+        """
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        new = Post.objects.create(text='Над порогом', author=self.author)
+        self.assertEqual(self.feed().object_list[0], new)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(
+                user=self.other, author=self.author
+            ).delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.other
+        ).exists())
+        page = self.feed()
+        self.assertEqual(page.object_list[0], new)
+        self.assertEqual(len(page), 10)
+
+    @override_settings(
+        TIMELINE_FANOUT_THRESHOLD=3, TIMELINE_PIPELINE='sync'
+    )
+    def test_author_below_threshold_backfills_all_followers(self):
+        """
+        Опустившись ниже порога, автор раскладывается по лентам всех
+        оставшихся подписчиков — одним запросом после коммита.
+        """
+        extra = User.objects.create(username='extra')
+        for user in (self.reader, self.other, extra):
+            Follow.objects.create(user=user, author=self.author)
+        new = Post.objects.create(text='Над порогом', author=self.author)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Follow.objects.filter(user=extra, author=self.author).delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(TimelineEntry.objects.filter(post=new).exists())
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        for user in (self.reader, self.other):
+            self.assertEqual(
+                TimelineEntry.objects.filter(user=user).count(), 13
+            )
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=user, post=new
+            ).exists())
+        self.assertFalse(TimelineEntry.objects.filter(user=extra).exists())
+        # Следующая отписка порог не пересекает и ничего не раскладывает
+        with self.captureOnCommitCallbacks() as callbacks:
+            Follow.objects.filter(
+                user=self.other, author=self.author
+            ).delete()
+        self.assertEqual(callbacks, [])
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='test_user')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_served_from_cache(self):
+        """
+        Повторный анонимный запрос не обращается к базе,
+        другой курсор — отдельная запись кэша.
+        """
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Тестовый текст')
+        with self.assertNumQueries(1):
+            self.client.get(reverse('index'), {'cursor': 'other'})
+
+    def test_not_modified(self):
+        """
+        На запрос с актуальным ETag отдаётся 304.
+        """
+        etag = self.client.get(reverse('index'))['ETag']
+        response = self.client.get(
+            reverse('index'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_cache_invalidated_by_new_post(self):
+        """
+        Новый пост сбрасывает кэш страниц.
+        """
+        self.client.get(reverse('index'))
+        Post.objects.create(text='Свежий пост', author=self.user)
+        self.assertContains(self.client.get(reverse('index')), 'Свежий пост')
+
+    def test_authenticated_bypass_cache(self):
+        """
+        Авторизованный пользователь не получает закэшированную страницу.
+        """
+        anonymous = self.client.get(reverse('index'))
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('index'), HTTP_IF_NONE_MATCH=anonymous['ETag']
+        )
+        self.assertContains(response, 'Редактировать')
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+
+    def test_not_modified_without_rendering(self):
+        """
+        Условный запрос авторизованного пользователя к актуальной
+        странице поста получает 304 без обращения к шаблонам.
+        """
+        self.client.force_login(self.user)
+        url = reverse('post', kwargs={
+            'username': self.user.username, 'post_id': self.post.pk
+        })
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_validators_scoped_to_page(self):
+        """
+        Комментарий к другому посту не меняет ETag страницы поста,
+        комментарий к самому посту — меняет.
+        """
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        url = reverse('post', kwargs={
+            'username': self.user.username, 'post_id': self.post.pk
+        })
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=other, author=self.user, text='Мимо')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_page_cache_scoped_to_group(self):
+        """
+        Пост в одной группе не сбрасывает кэш страницы другой группы,
+        а перенесённый пост уходит со страницы прежней группы.
+        """
+        first = Group.objects.create(title='Первая', slug='first')
+        second = Group.objects.create(title='Вторая', slug='second')
+        post = Post.objects.create(
+            text='Пост в группе', author=self.user, group=first
+        )
+        first_url = reverse('group_posts', kwargs={'slug': first.slug})
+        second_url = reverse('group_posts', kwargs={'slug': second.slug})
+        self.client.get(second_url)
+        Post.objects.create(text='Ещё пост', author=self.user, group=first)
+        with self.assertNumQueries(0):
+            self.client.get(second_url)
+        self.assertContains(self.client.get(first_url), 'Пост в группе')
+        post.group = second
+        post.save()
+        self.assertNotContains(self.client.get(first_url), 'Пост в группе')
+        self.assertContains(self.client.get(second_url), 'Пост в группе')
+
+    def test_relogin_changes_etag(self):
+        """
+        После выхода и повторного входа копия страницы с прежним
+        CSRF-токеном не подтверждается ответом 304.
+        """
+        url = reverse('post', kwargs={
+            'username': self.user.username, 'post_id': self.post.pk
+        })
+        self.client.force_login(self.user)
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='test_user')
+        cls.cat = Post.objects.create(
+            text='Кошка спит на диване', author=cls.user
+        )
+        cls.dog = Post.objects.create(
+            text='Собака спит во дворе', author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        return response.context['page']
+
+    def test_search_matches_all_words(self):
+        """
+        Находятся посты, в которых есть все слова запроса.
+        """
+        self.assertEqual(list(self.search('спит')), [self.dog, self.cat])
+        self.assertEqual(list(self.search('кошка спит')), [self.cat])
+        self.assertEqual(list(self.search('КОШКА')), [self.cat])
+        self.assertEqual(list(self.search('жираф')), [])
+
+    def test_search_matches_word_forms(self):
+        """
+        Слова сравниваются по основам: другая форма слова тоже
+        находит пост.
+        """
+        self.assertEqual(list(self.search('кошки')), [self.cat])
+        self.assertEqual(list(self.search('кошкой на диванах')), [self.cat])
+
+    def test_empty_query(self):
+        """
+        Без запроса страница показывает только форму.
+        """
+        response = self.client.get(reverse('search'))
+        self.assertIsNone(response.context['page'])
+
+    def test_index_follows_changes(self):
+        """
+        Индекс обновляется при редактировании и удалении поста.
+        """
+        post = Post.objects.create(text='Первый вариант', author=self.user)
+        post.text = 'Второй вариант'
+        post.save()
+        self.assertEqual(list(self.search('первый')), [])
+        self.assertEqual(list(self.search('второй')), [post])
+        post.delete()
+        self.assertEqual(list(self.search('вариант')), [])
+
+    def test_pages_keep_query(self):
+        """
+        Ссылки на следующие страницы сохраняют запрос.
+        """
+        for number in range(settings.POST_PAGE):
+            Post.objects.create(text=f'Кошка номер {number}', author=self.user)
+        response = self.client.get(reverse('search'), {'q': 'кошка'})
+        self.assertEqual(len(response.context['page']), settings.POST_PAGE)
+        cursor = response.context['page'].paginator.next_cursor
+        self.assertContains(response, f'?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0'
+                                      f'&amp;cursor={cursor}')
+        page = self.search('кошка', cursor=cursor)
+        self.assertEqual(list(page), [self.cat])
+
+
+@override_settings(
+    POST_COMMENTS=5, COMMENT_STREAM_THRESHOLD=3, COMMENT_STREAM_CHUNK=2
+)
+class PostCommentsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='test_user')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        cls.url = reverse('post', args=[cls.user.username, cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        for number in range(count):
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Комментарий {number}'
+            )
+
+    def test_short_page_not_streamed(self):
+        """
+        Пост с малым числом комментариев отдаётся обычным ответом со
+        всеми комментариями и без ссылки на более старые.
+        """
+        self.add_comments(3)
+        response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 2', 'Комментарий 1', 'Комментарий 0']
+        )
+        self.assertNotContains(response, 'Более старые комментарии')
+
+    def test_long_page_streamed_by_chunks(self):
+        """
+        Длинная страница отдаётся потоком: комментарии читаются
+        кусками по одному запросу, дальше POST_COMMENTS — ссылка
+        на более старые.
+        """
+        self.add_comments(7)
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(queries), 3)
+        for number in range(2, 7):
+            self.assertIn(f'Комментарий {number}<', content)
+        self.assertNotIn('Комментарий 1<', content)
+        self.assertTrue(content.rstrip().endswith('</html>'))
+        cursor = content.split('?comments=')[1].split('"')[0]
+        response = self.client.get(self.url, {'comments': cursor})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Комментарий 1<', content)
+        self.assertIn('Комментарий 0<', content)
+        self.assertNotIn('Комментарий 2<', content)
+        self.assertNotIn('Более старые комментарии', content)
+
+    @override_settings(COMMENTS_PAGE=3)
+    def test_older_comments_fragment(self):
+        """
+        Более старые комментарии подгружаются страницами по
+        COMMENTS_PAGE: фрагмент HTML или JSON, один запрос на страницу.
+        """
+        self.add_comments(7)
+        url = reverse(
+            'post_comments', args=[self.user.username, self.post.pk]
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, 'Комментарий 4<')
+        self.assertNotContains(response, 'Комментарий 3<')
+        content = response.content.decode()
+        cursor = content.split('?comments=')[1].split('"')[0]
+        self.assertContains(response, f'data-more="{url}?comments={cursor}"')
+        data = self.client.get(
+            url, {'comments': cursor, 'format': 'json'}
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий 3', 'Комментарий 2', 'Комментарий 1']
+        )
+        self.assertEqual(data['comments'][0]['author'], self.user.username)
+        data = self.client.get(
+            url, {'comments': data['next'], 'format': 'json'}
+        ).json()
+        self.assertEqual(len(data['comments']), 1)
+        self.assertIsNone(data['next'])
+
+    def test_older_comments_unknown_post(self):
+        """Фрагмент комментариев чужого или удалённого поста — 404."""
+        url = reverse('post_comments', args=['nobody', self.post.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.add_comments(2)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 404)
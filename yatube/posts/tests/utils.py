@@ -0,0 +1,30 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.budgets import check_budget
+
+
+class QueryBudgetMixin:
+    """
+    Проверка, что запрос укладывается в бюджет из QUERY_BUDGETS.
+    """
+
+    def assertWithinBudget(self, url_name, request):
+        """
+        Выполняет request() и сверяет число запросов и время SQL
+        с бюджетом url_name. Возвращает ответ.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        sql_time = sum(
+            float(query['time']) * 1000 for query in context.captured_queries
+        )
+        message = check_budget(
+            url_name, len(context.captured_queries), sql_time
+        )
+        if message is not None:
+            queries = '\n'.join(
+                query['sql'] for query in context.captured_queries
+            )
+            self.fail(f'{message}\n{queries}')
+        return response
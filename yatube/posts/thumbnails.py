@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from .cache import bump_versions
+from .models import Post
+from .pages import post_items
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = dict(EXTENSIONS, AVIF='avif')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который знает расширение AVIF.
+    """
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = FORMAT_EXTENSIONS[options['format']]
+        return f'{sorl_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+
+def supported_formats(formats):
+    """Форматы, которые умеют сохранять Pillow и бэкенд превью."""
+    Image.init()
+    return [
+        image_format for image_format in formats
+        if image_format in Image.SAVE and image_format in FORMAT_EXTENSIONS
+    ]
+
+
+def variant_geometry(variant, width):
+    """Геометрия sorl для ширины width с пропорциями варианта."""
+    base_width, base_height = variant['size']
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def ready_key(name, variant):
+    """Ключ готового набора превью варианта для файла name."""
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'posts:thumb:{digest}:{variant}'
+
+
+def pending_key(name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'posts:thumb:{digest}:pending'
+
+
+def ready_variant(image, variant):
+    """
+    Готовый набор превью варианта: {формат: [(ширина, адрес), ...]}
+    в порядке предпочтения форматов, или None, если он ещё не собран.
+    Стоит одного обращения к кэшу, исходник не открывается.
+    """
+    if not image:
+        return None
+    return cache.get(ready_key(image.name, variant))
+
+
+def render_variant(image, variant):
+    """Собирает все ширины и форматы варианта."""
+    renditions = {}
+    for image_format in supported_formats(variant['formats']):
+        renditions[image_format] = []
+        for width in variant['widths']:
+            thumbnail = get_thumbnail(
+                image, variant_geometry(variant, width),
+                format=image_format, **variant['options']
+            )
+            if default.kvstore.get(thumbnail) is None:
+                # Исходник недоступен: sorl вернул превью, которой
+                # нет ни в хранилище метаданных, ни на диске.
+                return None
+            renditions[image_format].append((width, thumbnail.url))
+    return renditions
+
+
+def collect_variants(image):
+    """
+    Собирает все варианты из settings.THUMBNAIL_VARIANTS.
+    Возвращает {ключ готовности: набор превью} или None, если
+    исходник недоступен.
+    """
+    ready = {}
+    for name, variant in settings.THUMBNAIL_VARIANTS.items():
+        renditions = render_variant(image, variant)
+        if renditions is None:
+            logger.warning('Нет исходника %s для превью', image.name)
+            return None
+        ready[ready_key(image.name, name)] = renditions
+    return ready
+
+
+def render_variants(post_id, image):
+    """
+    Собирает варианты картинки поста и отмечает их готовыми.
+    Карточка поста и страницы, где он показан, получают новую версию,
+    чтобы заглушка сменилась картинкой. Возвращает False, если
+    исходник недоступен.
+    """
+    ready = collect_variants(image)
+    if ready is None:
+        return False
+    cache.set_many(ready, None)
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    bump_versions(post_items(post) if post else [('post', post_id)])
+    return True
+
+
+def _run(post_id, image, close_connections):
+    rendered = False
+    try:
+        rendered = render_variants(post_id, image)
+    except Exception:
+        logger.exception('Не удалось собрать превью %s', image.name)
+    finally:
+        if rendered:
+            cache.delete(pending_key(image.name))
+        else:
+            # Отметка остаётся: иначе каждый показ заглушки снова
+            # ставил бы битый исходник в сборку
+            cache.set(
+                pending_key(image.name), True,
+                settings.THUMBNAIL_FAILURE_TIMEOUT
+            )
+        if close_connections:
+            # Соединения потока не переиспользуются запросами.
+            connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def schedule(post):
+    """
+    Ставит сборку превью поста в фон после коммита транзакции.
+
+    settings.THUMBNAIL_PIPELINE: 'thread' — пул потоков процесса,
+    'sync' — сразу после коммита в текущем потоке. Повторная
+    постановка того же файла, пока он собирается, игнорируется, как
+    и в течение THUMBNAIL_FAILURE_TIMEOUT после неудачной сборки.
+    """
+    image = post.image
+    if not image:
+        return
+    if not cache.add(
+        pending_key(image.name), True, settings.THUMBNAIL_PENDING_TIMEOUT
+    ):
+        return
+    post_id = post.pk
+
+    def submit():
+        if settings.THUMBNAIL_PIPELINE == 'sync':
+            _run(post_id, image, close_connections=False)
+        else:
+            get_executor().submit(_run, post_id, image, True)
+
+    transaction.on_commit(submit)
+
+
+def delete_image(name):
+    """Удаляет файл, все его превью и отметки о готовности."""
+    storage = Post._meta.get_field('image').storage
+    try:
+        default.backend.delete(ImageFile(name, storage))
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить %s', name)
+    cache.delete_many([
+        ready_key(name, variant) for variant in settings.THUMBNAIL_VARIANTS
+    ])
+
+
+def is_recent(name, min_age):
+    """Файл картинки изменён меньше min_age секунд назад."""
+    storage = Post._meta.get_field('image').storage
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+    try:
+        return storage.get_modified_time(name) > cutoff
+    except (OSError, SuspiciousFileOperation):
+        return False
+
+
+def release(name):
+    """
+    Отпускает ссылку поста на файл картинки после коммита. Файл
+    общий для всех постов с тем же содержимым, поэтому удаляется
+    только когда на него не ссылается ни один пост.
+
+    Файл моложе MEDIA_MIN_AGE не удаляется: его могли только что
+    загрузить повторно для поста, который ещё не сохранён. Такие
+    файлы потом соберёт gc_media.
+    """
+    if not name:
+        return
+
+    def collect():
+        if is_recent(name, settings.MEDIA_MIN_AGE):
+            return
+        if not Post.objects.filter(image=name).exists():
+            delete_image(name)
+
+    transaction.on_commit(collect)
@@ -0,0 +1,418 @@
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .paginators import CursorPaginator, keyset
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BaseTimeline:
+    """
+    Хранилище ленты подписок (fan-out on write).
+
+    Лента пользователя — упорядоченный набор ключей (pub_date, post_id)
+    постов авторов, на которых он подписан. Новый пост раскладывается
+    по лентам подписчиков при сохранении, поэтому чтение страницы
+    не зависит от числа подписок.
+    """
+
+    def push(self, post, user_ids):
+        """Добавляет пост в ленты пользователей user_ids."""
+        raise NotImplementedError
+
+    def push_many(self, posts, user_ids):
+        """Добавляет несколько постов одного автора в ленты user_ids."""
+        user_ids = list(user_ids)
+        for post in posts:
+            self.push(post, user_ids)
+
+    def remove(self, post):
+        """Убирает пост из всех лент."""
+        raise NotImplementedError
+
+    def backfill(self, user_id, author_id):
+        """Заполняет ленту последними постами нового автора."""
+        raise NotImplementedError
+
+    def backfill_followers(self, author_id):
+        """
+        Заполняет ленты всех подписчиков автора его последними постами.
+        """
+        raise NotImplementedError
+
+    def prune(self, user_id, author_id):
+        """Убирает из ленты посты автора после отписки."""
+        raise NotImplementedError
+
+    def slice(self, user_id, position, newer, limit):
+        """
+        Ключи (pub_date, post_id) ленты от позиции position,
+        от новых к старым.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Очищает все ленты."""
+        raise NotImplementedError
+
+    @staticmethod
+    def latest_posts(author_id):
+        """Посты автора, которые попадают в ленту при подписке."""
+        return Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('pub_date', 'id')[:settings.TIMELINE_BACKFILL]
+
+
+class DatabaseTimeline(BaseTimeline):
+    """
+    Ленты в таблице TimelineEntry.
+    """
+
+    def push(self, post, user_ids):
+        user_ids = iter(user_ids)
+        batch_size = settings.TIMELINE_BATCH_SIZE
+        while True:
+            batch = list(islice(user_ids, batch_size))
+            if not batch:
+                break
+            TimelineEntry.objects.bulk_create(
+                [
+                    TimelineEntry(
+                        user_id=user_id, post_id=post.pk,
+                        author_id=post.author_id, pub_date=post.pub_date
+                    )
+                    for user_id in batch
+                ],
+                ignore_conflicts=True
+            )
+
+    def push_many(self, posts, user_ids):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id, post_id=post.pk,
+                    author_id=post.author_id, pub_date=post.pub_date
+                )
+                for user_id in user_ids
+                for post in posts
+            ],
+            batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    def remove(self, post):
+        TimelineEntry.objects.filter(post_id=post.pk).delete()
+
+    def backfill(self, user_id, author_id):
+        entries = [
+            TimelineEntry(
+                user_id=user_id, post_id=post_id,
+                author_id=author_id, pub_date=pub_date
+            )
+            for pub_date, post_id in self.latest_posts(author_id)
+        ]
+        TimelineEntry.objects.bulk_create(
+            entries, batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    def backfill_followers(self, author_id):
+        # Один INSERT ... SELECT: последние посты автора читаются один
+        # раз и раскладываются сразу всем подписчикам
+        entries = TimelineEntry._meta.db_table
+        posts = Post._meta.db_table
+        follows = Follow._meta.db_table
+        connection = connections[router.db_for_write(TimelineEntry)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {entries} (user_id, post_id, author_id, '
+                f'pub_date) '
+                f'SELECT follow.user_id, latest.id, latest.author_id, '
+                f'latest.pub_date FROM {follows} follow, '
+                f'(SELECT id, author_id, pub_date FROM {posts} '
+                f'WHERE author_id = %s ORDER BY pub_date DESC, id DESC '
+                f'LIMIT %s) latest '
+                f'WHERE follow.author_id = %s ON CONFLICT DO NOTHING',
+                [author_id, settings.TIMELINE_BACKFILL, author_id]
+            )
+
+    def prune(self, user_id, author_id):
+        TimelineEntry.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).delete()
+
+    def slice(self, user_id, position, newer, limit):
+        entries = TimelineEntry.objects.filter(user_id=user_id).values_list(
+            'pub_date', 'post_id'
+        )
+        return keyset(entries, position, newer, limit, 'pub_date', 'post_id')
+
+    def clear(self):
+        TimelineEntry.objects.all().delete()
+
+
+class LocalTimeline(BaseTimeline):
+    """
+    Ленты в памяти процесса: отсортированные списки ключей.
+    Подходит для тестов и одиночного процесса разработки.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.authors = {}
+
+    def _insert(self, user_id, key, author_id):
+        keys = self.keys.setdefault(user_id, [])
+        index = bisect.bisect_left(keys, key)
+        if index == len(keys) or keys[index] != key:
+            keys.insert(index, key)
+        self.authors[key[1]] = author_id
+
+    def push(self, post, user_ids):
+        key = (post.pub_date, post.pk)
+        with self.lock:
+            for user_id in user_ids:
+                self._insert(user_id, key, post.author_id)
+
+    def remove(self, post):
+        key = (post.pub_date, post.pk)
+        with self.lock:
+            for keys in self.keys.values():
+                index = bisect.bisect_left(keys, key)
+                if index < len(keys) and keys[index] == key:
+                    del keys[index]
+            self.authors.pop(post.pk, None)
+
+    def backfill(self, user_id, author_id):
+        posts = list(self.latest_posts(author_id))
+        with self.lock:
+            for key in posts:
+                self._insert(user_id, key, author_id)
+
+    def backfill_followers(self, author_id):
+        posts = list(self.latest_posts(author_id))
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        with self.lock:
+            for user_id in followers:
+                for key in posts:
+                    self._insert(user_id, key, author_id)
+
+    def prune(self, user_id, author_id):
+        with self.lock:
+            self.keys[user_id] = [
+                key for key in self.keys.get(user_id, [])
+                if self.authors.get(key[1]) != author_id
+            ]
+
+    def slice(self, user_id, position, newer, limit):
+        with self.lock:
+            keys = self.keys.get(user_id, [])
+            if position is None:
+                found = keys[-limit:]
+            elif newer:
+                start = bisect.bisect_right(keys, position)
+                found = keys[start:start + limit]
+            else:
+                end = bisect.bisect_left(keys, position)
+                found = keys[max(end - limit, 0):end]
+        return list(reversed(found))
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.authors.clear()
+
+
+@lru_cache(maxsize=None)
+def get_timeline():
+    """Хранилище лент из settings.TIMELINE_BACKEND."""
+    return import_string(settings.TIMELINE_BACKEND)()
+
+
+@receiver(setting_changed)
+def reset_timeline(sender, setting, **kwargs):
+    if setting == 'TIMELINE_BACKEND':
+        get_timeline.cache_clear()
+
+
+def is_pulled(author_id):
+    """
+    Гибридный режим: посты авторов, у которых подписчиков не меньше
+    TIMELINE_FANOUT_THRESHOLD, не раскладываются по лентам, а
+    подмешиваются при чтении (флаг UserCounter.pulled). None
+    отключает гибридный режим.
+    """
+    if settings.TIMELINE_FANOUT_THRESHOLD is None:
+        return False
+    return UserCounter.objects.filter(
+        user_id=author_id, pulled=True
+    ).exists()
+
+
+def pulled_authors(user_id):
+    """Авторы из подписок пользователя, которых читаем при запросе."""
+    if settings.TIMELINE_FANOUT_THRESHOLD is None:
+        return []
+    return list(Follow.objects.filter(
+        user_id=user_id, author__counters__pulled=True
+    ).values_list('author_id', flat=True))
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    get_timeline().push(post, followers.iterator())
+
+
+def fan_out_batch(posts):
+    """
+    Раскладывает пачку новых постов (импорт): флаг pulled и
+    подписчики каждого автора читаются одним запросом на пачку.
+    """
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    if settings.TIMELINE_FANOUT_THRESHOLD is not None:
+        for author_id in UserCounter.objects.filter(
+            user_id__in=by_author, pulled=True
+        ).values_list('user_id', flat=True):
+            del by_author[author_id]
+    if not by_author:
+        return
+    followers = defaultdict(list)
+    for author_id, user_id in Follow.objects.filter(
+        author_id__in=by_author
+    ).values_list('author_id', 'user_id').iterator():
+        followers[author_id].append(user_id)
+    timeline = get_timeline()
+    for author_id, author_posts in by_author.items():
+        if followers[author_id]:
+            timeline.push_many(author_posts, followers[author_id])
+
+
+def backfill(user_id, author_id):
+    """
+    Заполняет ленту после подписки, если автор раскладывается.
+    Автор, дошедший до порога, с этой подписки читается при запросе.
+    """
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is not None:
+        row = UserCounter.objects.filter(user_id=author_id).values_list(
+            'pulled', 'followers'
+        ).first()
+        if row is not None and row[0]:
+            return
+        if row is not None and row[1] >= threshold:
+            UserCounter.objects.filter(user_id=author_id).update(
+                pulled=True
+            )
+            return
+    get_timeline().backfill(user_id, author_id)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='timeline'
+            )
+    return _executor
+
+
+def _run(author_id, close_connections):
+    try:
+        get_timeline().backfill_followers(author_id)
+    except Exception:
+        logger.exception('Не удалось разложить посты автора %s', author_id)
+    finally:
+        if close_connections:
+            # Соединения потока не переиспользуются запросами.
+            connections.close_all()
+
+
+def follower_lost(author_id):
+    """
+    После отписки: если автор опустился ниже порога, его посты
+    перестают подмешиваться при чтении. Написанные «над порогом»
+    посты не были разложены, поэтому последние посты автора
+    раскладываются по лентам всех оставшихся подписчиков.
+
+    Переход ловит условный UPDATE флага pulled, а не точное число
+    подписчиков: при одновременных отписках его выполнит ровно одна.
+    Раскладка идёт после коммита вне запроса (TIMELINE_PIPELINE:
+    thread — фоновый поток, sync — сразу в текущем потоке).
+    """
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is None or not UserCounter.objects.filter(
+        user_id=author_id, pulled=True, followers__lt=threshold
+    ).update(pulled=False):
+        return
+
+    def submit():
+        if settings.TIMELINE_PIPELINE == 'sync':
+            _run(author_id, close_connections=False)
+        else:
+            get_executor().submit(_run, author_id, True)
+
+    transaction.on_commit(submit)
+
+
+def read_slice(user_id, position, newer, limit):
+    """
+    Ключи ленты: разложенные посты из хранилища плюс посты «тяжёлых»
+    авторов, прочитанные тем же срезом по ключу. Пост, попавший в ленту
+    до того, как автор перешёл порог, встречается один раз.
+    """
+    keys = get_timeline().slice(user_id, position, newer, limit)
+    authors = pulled_authors(user_id)
+    if not authors:
+        return keys
+    pulled = keyset(
+        Post.objects.filter(author_id__in=authors).values_list(
+            'pub_date', 'id'
+        ),
+        position, newer, limit
+    )
+    merged = sorted(set(keys) | set(pulled), reverse=True)
+    return merged[-limit:] if newer else merged[:limit]
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Курсорный пагинатор поверх ленты подписок: ключи берутся из
+    хранилища ленты, посты догружаются одним запросом по id.
+    """
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def fetch(self, position, newer, limit):
+        keys = read_slice(self.user.pk, position, newer, limit)
+        posts = Post.objects.for_feed().in_bulk(
+            [post_id for _, post_id in keys]
+        )
+        return [posts[post_id] for _, post_id in keys if post_id in posts]
@@ -0,0 +1,67 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def normalize_image(upload):
+    """
+    Приводит загруженную картинку к «мастеру» для превью.
+
+    Проверяет размер файла и число пикселей по заголовку, не декодируя
+    картинку. JPEG декодируется сразу в уменьшенном масштабе (draft),
+    ориентация из EXIF применяется к пикселям, сами EXIF-данные
+    отбрасываются. Картинка уменьшается до IMAGE_MASTER_SIZE и
+    пересохраняется: JPEG, либо PNG для картинок с прозрачностью.
+    """
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)},
+        )
+    upload.seek(0)
+    with Image.open(upload) as source:
+        width, height = source.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)s мегапикселей.',
+                code='too_many_pixels',
+                params={
+                    'limit': settings.IMAGE_UPLOAD_MAX_PIXELS // 10 ** 6
+                },
+            )
+        source.draft('RGB', settings.IMAGE_MASTER_SIZE)
+        image = ImageOps.exif_transpose(source)
+        icc_profile = image.info.get('icc_profile')
+        if has_alpha(image):
+            image, image_format = image.convert('RGBA'), 'PNG'
+        else:
+            image, image_format = image.convert('RGB'), 'JPEG'
+    image.thumbnail(settings.IMAGE_MASTER_SIZE, Image.LANCZOS)
+
+    buffer = BytesIO()
+    options = {'optimize': True}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    if image_format == 'JPEG':
+        options.update(
+            quality=settings.IMAGE_MASTER_QUALITY, progressive=True
+        )
+    image.save(buffer, image_format, **options)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    extension = 'png' if image_format == 'PNG' else 'jpg'
+    return InMemoryUploadedFile(
+        buffer, 'image', f'{name}.{extension}',
+        Image.MIME[image_format], buffer.tell(), None
+    )
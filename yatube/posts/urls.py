@@ -1,13 +1,20 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# Под ASGI страницы чтения обслуживают асинхронные версии
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('follow/', views.follow_index, name='follow_index'),
-    path('group/<slug:slug>/', views.group_posts, name='group_posts'),
-    path('<str:username>/', views.profile, name='profile'),
-    path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path('', read_views.index, name='index'),
+    path('follow/', read_views.follow_index, name='follow_index'),
+    path('group/<slug:slug>/', read_views.group_posts, name='group_posts'),
+    path('search/', views.search, name='search'),
+    path('<str:username>/', read_views.profile, name='profile'),
+    path('<str:username>/<int:post_id>/', read_views.post_view, name='post'),
+    path('<str:username>/<int:post_id>/comments/',
+         read_views.post_comments, name='post_comments'),
     path('new', views.new_post, name='new_post'),
     path('<str:username>/<int:post_id>/edit/',
          views.post_edit,
@@ -1,70 +1,112 @@
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
+from .cache import cache_anonymous_page, conditional_page, feed_key
+from .comments import (CommentWindow, comment_position, render_comments_page,
+                       render_with_comments)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-
-
+from .models import Follow, Group, Post, User, UserCounter
+from .pages import (comments_pages, follow_pages, group_pages, index_pages,
+                    post_pages, profile_pages)
+from .paginators import paginate
+from .routers import use_replica
+from .search import search as search_posts
+from .thumbnails import release, schedule
+from .timeline import TimelinePaginator
+
+
+@use_replica
+@conditional_page(index_pages)
+@cache_anonymous_page
 def index(request):
     """
     Главная страница.
     """
-    post_list = Post.objects.select_related('group').all()
-    paginator = Paginator(post_list, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page = paginate(request, post_list, cache_key=feed_key('index'))
     return render(request, 'posts/index.html', {'page': page})
 
 
+@use_replica
+@conditional_page(group_pages)
+@cache_anonymous_page
 def group_posts(request, slug):
     """
     Страница группы.
     """
     group = get_object_or_404(Group, slug=slug)
-    posts = group.groups.all()
-    paginator = Paginator(posts, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, group.groups.for_feed())
     return render(request, 'posts/group.html', {'group': group, 'page': page})
 
 
+@use_replica
+@conditional_page(index_pages)
+@cache_anonymous_page
+def search(request):
+    """
+    Поиск по тексту постов.
+    """
+    query = request.GET.get('q', '').strip()
+    page = None
+    if query:
+        post_list = search_posts(Post.objects.for_feed(), query)
+        page = paginate(request, post_list)
+    return render(request, 'posts/search.html', {'query': query,
+                                                 'page': page})
+
+
+@use_replica
+@conditional_page(profile_pages)
+@cache_anonymous_page
 def profile(request, username):
     """
     Страница профиля автора со всеми постами.
     """
     author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
-    posts_count = author_posts.count()
-    paginator = Paginator(author_posts, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    counters = UserCounter.for_user(author)
+    page = paginate(request, author.posts.for_feed(), count=counters.posts)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author
         ).exists()
     return render(request, 'posts/profile.html', {'author': author,
-                                                  'count': posts_count,
+                                                  'count': counters.posts,
+                                                  'counters': counters,
                                                   'page': page,
                                                   'following': following})
 
 
+@use_replica
+@conditional_page(post_pages)
+@cache_anonymous_page
 def post_view(request, username, post_id):
     """
     Страница отдельного поста.
     """
     author = get_object_or_404(User, username=username)
-    posts_count = author.posts.count()
-    post = get_object_or_404(Post, pk=post_id)
+    counters = UserCounter.for_user(author)
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
     form = CommentForm()
-    comments = post.comments.all()
-    return render(request, 'posts/post.html', {'author': author,
-                                               'count': posts_count,
-                                               'post': post,
-                                               'form': form,
-                                               'comments': comments})
+    comments = CommentWindow(post, comment_position(request))
+    return render_with_comments(request, 'posts/post.html', {
+        'author': author,
+        'count': counters.posts,
+        'counters': counters,
+        'post': post,
+        'form': form,
+        'comments': comments,
+    })
+
+
+@use_replica
+@conditional_page(comments_pages)
+@cache_anonymous_page
+def post_comments(request, username, post_id):
+    """
+    Более старые комментарии поста: HTML-фрагмент или JSON.
+    """
+    return render_comments_page(request, username, post_id)
 
 
 @login_required
@@ -72,11 +114,12 @@ def new_post(request):
     """
     Страница с формой создания нового поста.
     """
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule(post)
         return redirect('index')
     return render(request, 'posts/new.html', {'form': form})
 
@@ -92,8 +135,12 @@ def post_edit(request, username, post_id):
     form = PostForm(
         request.POST or None, files=request.FILES or None, instance=post
     )
+    previous = post.image.name
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if post.image.name != previous:
+            release(previous)
+        schedule(post)
         return redirect('post', username=username, post_id=post_id)
     return render(request, 'posts/new.html', {'form': form,
                                               'post': post,
@@ -121,15 +168,17 @@ def add_comment(request, username, post_id):
     )
 
 
+@use_replica
 @login_required
+@conditional_page(follow_pages)
 def follow_index(request):
     """
     Страница с избранными авторами.
     """
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.POST_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed().filter(
+        author__following__user=request.user
+    )
+    page = paginate(request, post_list, TimelinePaginator, user=request.user)
     return render(request, 'posts/follow.html', {'page': page})
 
 
@@ -150,9 +199,7 @@ def profile_unfollow(request, username):
     Отписка от автора.
     """
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.get(user=request.user, author=author)
-    if request.user != author:
-        follow.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('profile', username=username)
 
 
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 
@@ -59,8 +61,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Проверка бюджета SQL-запросов на каждый ответ (posts/budgets.py):
+# log — предупреждение в лог, raise — исключение, пусто — выключена
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', '')
+if QUERY_BUDGET_MODE:
+    MIDDLEWARE.append('posts.middleware.QueryBudgetMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
+# Асинхронные view страниц чтения (posts/async_views.py); asgi.py
+# включает их по умолчанию
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '') == '1'
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
@@ -79,16 +91,71 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# DB_ENGINE: sqlite (по умолчанию) или postgresql. Соединения живут
+# DB_CONN_MAX_AGE секунд и переиспользуются между запросами; оборванное
+# соединение закрывается до начала запроса (CONN_HEALTH_CHECKS)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'yatube'),
+            'USER': os.getenv('DB_USER', 'yatube'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Сколько секунд ждать блокировку записи
+                'timeout': 20,
+            },
+        }
+    }
+
+# Реплики только для чтения (posts/routers.py), через запятую: для
+# SQLite — пути к файлам, для PostgreSQL — хосты. В тестах реплики
+# зеркалят default
+REPLICA_DATABASES = []
+for number, location in enumerate(
+        filter(None, host_list(os.getenv('DB_REPLICAS', ''))), 1):
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    replica['HOST' if DB_ENGINE == 'postgresql' else 'NAME'] = location
+    DATABASES[f'replica{number}'] = replica
+    REPLICA_DATABASES.append(f'replica{number}')
+DATABASE_ROUTERS = ['posts.routers.ReplicaRouter']
+# Сколько секунд после своей записи пользователь читает с основной
+# базы, а не с реплик
+REPLICA_LAG = int(os.getenv('REPLICA_LAG', 5))
+if REPLICA_DATABASES:
+    MIDDLEWARE.append('posts.middleware.ReadYourWritesMiddleware')
+
+# PRAGMA для каждого соединения SQLite (posts/db.py): журнал WAL,
+# fsync только на контрольных точках, ожидание блокировки в мс,
+# отображение файла в память и кэш страниц (отрицательный — в КиБ)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
 }
 
 
@@ -135,6 +202,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Картинки, сохранённые или загруженные повторно меньше стольких секунд
+# назад, не удаляются ни вместе с постом, ни gc_media: на них может
+# ссылаться ещё не сохранённый пост
+MEDIA_MIN_AGE = 3600
+
+# Загрузки пишутся во временный файл частями, а не собираются в памяти.
+# Картинки постов больше лимитов отклоняются, остальные пересохраняются
+# без EXIF в размере не больше IMAGE_MASTER_SIZE
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MASTER_SIZE = (2560, 2560)
+IMAGE_MASTER_QUALITY = 85
 
 # Login
 
@@ -150,12 +232,156 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 # Переменная с кол-вом постов на странице
 POST_PAGE = 10
 
-# Подключение бэенда кэширования
+# Админка: с какого размера таблицы число строк берётся из статистики
+# PostgreSQL и сколько секунд кэшируется COUNT(*) списка
+ADMIN_ESTIMATE_THRESHOLD = 100000
+ADMIN_COUNT_TIMEOUT = 60
+
+# Страницы ?page=N: число постов считается не дальше предела
+# и кэшируется на столько секунд
+PAGINATOR_COUNT_CAP = 1000
+PAGINATOR_COUNT_TIMEOUT = 60
+
+# Комментарии на странице поста (posts/comments.py): сколько
+# показывать за раз и сколько подгружать кнопкой «Более старые»,
+# с какого числа комментариев страница отдаётся потоком и по сколько
+# комментариев в куске потока
+POST_COMMENTS = 500
+COMMENTS_PAGE = 50
+COMMENT_STREAM_THRESHOLD = 100
+COMMENT_STREAM_CHUNK = 50
+
+# Хранилище ленты подписок и сколько постов автора попадает
+# в ленту при подписке
+TIMELINE_BACKEND = 'posts.timeline.DatabaseTimeline'
+TIMELINE_BACKFILL = 1000
+TIMELINE_BATCH_SIZE = 1000
+# Авторы с таким числом подписчиков читаются при запросе ленты,
+# а не раскладываются при записи; None — раскладывать всех
+TIMELINE_FANOUT_THRESHOLD = 10000
+# Раскладка постов автора, опустившегося ниже порога: thread — в
+# фоновом потоке после коммита, sync — сразу после коммита
+TIMELINE_PIPELINE = os.getenv('TIMELINE_PIPELINE', 'thread')
+
+# Подключение бэенда кэширования. По умолчанию кэш в памяти процесса;
+# для нескольких воркеров нужен общий: file (каталог на диске),
+# db (таблица, python manage.py createcachetable), memcached или redis.
+# Для memcached и redis нужны пакеты не из requirements.txt, см.
+# CACHE_PACKAGES
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+CACHE_DEFAULT_LOCATIONS = {
+    'file': os.path.join(BASE_DIR, 'cache'),
+    'db': 'yatube_cache',
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+# Метаданные превью лежат отдельно: очистка кэша по умолчанию не
+# должна сбрасывать их. memcached не делит сервер между кэшами, для
+# него нужен отдельный THUMBNAIL_CACHE_LOCATION
+THUMBNAIL_CACHE_LOCATIONS = {
+    'locmem': 'thumbnails',
+    'file': os.path.join(BASE_DIR, 'cache_thumbnails'),
+    'db': 'yatube_thumbnail_cache',
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/2',
+}
+CACHE_PACKAGES = {
+    'memcached': ('pymemcache', 'pymemcache'),
+    'redis': ('django_redis', 'django-redis'),
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'Неизвестный CACHE_BACKEND={CACHE_BACKEND}, '
+        f'варианты: {", ".join(CACHE_BACKENDS)}'
+    )
+if CACHE_BACKEND in CACHE_PACKAGES:
+    module, package = CACHE_PACKAGES[CACHE_BACKEND]
+    if find_spec(module) is None:
+        raise ImproperlyConfigured(
+            f'Для CACHE_BACKEND={CACHE_BACKEND} установите пакет '
+            f'{package}: pip install {package}'
+        )
+CACHE_LOCATION = (
+    os.getenv('CACHE_LOCATION')
+    or CACHE_DEFAULT_LOCATIONS.get(CACHE_BACKEND, '')
+)
+THUMBNAIL_CACHE_LOCATION = (
+    os.getenv('THUMBNAIL_CACHE_LOCATION')
+    or THUMBNAIL_CACHE_LOCATIONS[CACHE_BACKEND]
+)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': CACHE_LOCATION,
+    },
+    # Метаданные превью sorl-thumbnail: тот же общий бэкенд,
+    # своё место, префикс и ключи без срока жизни
+    'thumbnails': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': THUMBNAIL_CACHE_LOCATION,
+        'KEY_PREFIX': 'thumbnails',
+        'TIMEOUT': None,
+    },
+}
+
+# Первая страница главной кэшируется с пересчётом одним процессом
+# и вероятностным ранним пересчётом (CACHE_EARLY_BETA, 0 — выключен)
+FEED_CACHE_TIMEOUT = 20
+CACHE_LOCK_TIMEOUT = 5
+CACHE_LOCK_POLL = 0.05
+CACHE_EARLY_BETA = 1.0
+
+# Варианты превью постов: пропорции (size), ширины для srcset,
+# форматы в порядке предпочтения (последний — запасной <img>;
+# форматы, которые не умеет сохранять Pillow, пропускаются),
+# опции sorl-thumbnail и атрибут sizes.
+# Превью собираются в фоне после сохранения поста, до готовности
+# шаблон показывает заглушку. THUMBNAIL_PIPELINE: thread — пул
+# потоков процесса, sync — сразу после коммита
+THUMBNAIL_VARIANTS = {
+    'card': {
+        'size': (960, 500),
+        'widths': (480, 720, 960),
+        'formats': ('AVIF', 'WEBP', 'JPEG'),
+        'options': {'crop': 'center', 'upscale': True, 'quality': 80},
+        'sizes': '(max-width: 992px) 100vw, 960px',
+    },
+}
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+
+# Хранилище метаданных превью, общее для всех воркеров: db — таблица
+# sorl-thumbnail с кэшем 'thumbnails' перед ней, redis — сразу Redis
+# (THUMBNAIL_REDIS_URL). Заполняется командой warm_thumbnails
+THUMBNAIL_KVSTORES = {
+    'db': 'sorl.thumbnail.kvstores.cached_db_kvstore.KVStore',
+    'redis': 'sorl.thumbnail.kvstores.redis_kvstore.KVStore',
 }
+THUMBNAIL_KVSTORE = THUMBNAIL_KVSTORES[os.getenv('THUMBNAIL_KVSTORE', 'db')]
+THUMBNAIL_CACHE = 'thumbnails'
+THUMBNAIL_CACHE_TIMEOUT = None
+if os.getenv('THUMBNAIL_REDIS_URL'):
+    THUMBNAIL_REDIS_URL = os.getenv('THUMBNAIL_REDIS_URL')
+THUMBNAIL_PIPELINE = os.getenv('THUMBNAIL_PIPELINE', 'thread')
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PENDING_TIMEOUT = 60
+# Картинка, превью которой собрать не удалось, не ставится в сборку
+# повторно столько секунд
+THUMBNAIL_FAILURE_TIMEOUT = 600
+
+# Сколько живёт фрагмент карточки поста; устаревшие фрагменты
+# отсекаются версией в ключе, а не временем
+POST_CARD_CACHE_TIMEOUT = 60 * 15
+
+# Сколько живёт закэшированная страница для анонимов; при изменении
+# постов, комментариев, групп и подписок кэш сбрасывается сразу
+PAGE_CACHE_TIMEOUT = 60 * 5
 
 INTERNAL_IPS = [
     "127.0.0.1",